@@ -1,18 +1,57 @@
 """
 Comprehensive PDF structure analysis to identify all fields and their positions
 """
+import pandas as pd
 import pdfplumber
+import pypdfium2 as pdfium
 import re
 
+# Bytes pattern: numeric scans skip Unicode digit classification entirely
+_NUM_RE = re.compile(rb'[\d,]+\.?\d*')
+
+# One pass over a data line: ticket (first token, at least 6 tokens on the
+# line), first standalone 5-digit CPT code and first date, wherever they sit.
+_ROW_RE = re.compile(
+    r'^(?=(?:.*?(?<!\S)(?P<cpt>\d{5})(?!\S))?)'
+    r'(?=(?:.*?(?P<date>\d{1,2}/\d{1,2}/\d{2}))?)'
+    r'\s*(?P<ticket>\d{8}\S*)(?=(?:\s+\S+){5})',
+    re.ASCII,
+)
+
+def _starts_with_8_digits(line):
+    """Cheap check for a data line (8-digit ticket number) without regex."""
+    s = line.lstrip()
+    return len(s) >= 8 and s[:8].isdigit()
+
+def _page_texts(pdf_path, start=0):
+    """Yield (page_index, text) for each page from start using pdfium's text layer.
+
+    Much cheaper than pdfplumber for passes that only need plain text, since
+    no layout analysis is performed.
+    """
+    pdf = pdfium.PdfDocument(pdf_path)
+    try:
+        for i in range(start, len(pdf)):
+            page = pdf[i]
+            textpage = page.get_textpage()
+            try:
+                yield i, textpage.get_text_range()
+            finally:
+                textpage.close()
+                page.close()
+    finally:
+        pdf.close()
+
 def analyze_comprehensive_structure(pdf_path, page_num=3):
     """Analyze the complete structure including headers and data"""
     
-    with pdfplumber.open(pdf_path) as pdf:
-        if page_num >= len(pdf.pages):
+    # Only materialize the requested page (pdfplumber page numbers are 1-based)
+    with pdfplumber.open(pdf_path, pages=[page_num + 1]) as pdf:
+        if not pdf.pages:
             print(f"Page {page_num + 1} not found")
             return
         
-        page = pdf.pages[page_num]
+        page = pdf.pages[0]
         
         # Try to extract tables first
         tables = page.extract_tables()
@@ -41,15 +80,18 @@ def analyze_comprehensive_structure(pdf_path, page_num=3):
             print("\n\n=== RAW TEXT ANALYSIS ===")
             lines = text.split('\n')
             
-            # Find header area
+            # Find header area, keeping the first data line and the one before
+            # it so nothing has to be looked up again afterwards
             header_lines = []
             data_start = -1
+            prev_line = data_line = None
             for i, line in enumerate(lines):
                 if 'Phys' in line or 'Ticket' in line or 'Note' in line:
                     header_lines.append((i, line))
-                if re.match(r'^\d{8}', line.strip()) and data_start == -1:
-                    data_start = i
+                if _starts_with_8_digits(line):
+                    data_start, data_line = i, line
                     break
+                prev_line = line
             
             print("\nHeader area:")
             for idx, line in header_lines:
@@ -58,20 +100,21 @@ def analyze_comprehensive_structure(pdf_path, page_num=3):
             # Analyze the specific line before first data line
             if data_start > 0:
                 print(f"\nLine before first data (Line {data_start-1}):")
-                print(repr(lines[data_start-1]))
+                print(repr(prev_line))
             
             # Analyze first data line character by character
-            if data_start >= 0 and data_start < len(lines):
+            if data_line is not None:
                 print(f"\n\nFirst data line analysis (Line {data_start}):")
-                line = lines[data_start]
+                line = data_line
                 print(f"Full line: {line}")
                 print(f"Length: {len(line)} characters")
                 
                 # Show character positions
                 print("\nCharacter mapping:")
-                for i in range(0, min(len(line), 200), 10):
-                    chars = line[i:i+10]
-                    print(f"{i:3d}-{i+9:3d}: '{chars}'")
+                head = line[:200]
+                chunks = [head[i:i+10] for i in range(0, len(head), 10)]
+                for idx, chars in enumerate(chunks):
+                    print(f"{idx*10:3d}-{idx*10+9:3d}: '{chars}'")
                 
                 # Try to identify Note field (single character)
                 print("\n\nAnalyzing 'Note' field position:")
@@ -84,8 +127,10 @@ def analyze_comprehensive_structure(pdf_path, page_num=3):
                 # Look for numeric patterns in the latter part
                 print("\n\nNumeric values in line:")
                 # Find all numeric patterns
-                numeric_pattern = r'[\d,]+\.?\d*'
-                numbers = [(m.start(), m.group()) for m in re.finditer(numeric_pattern, line)]
+                # latin-1 keeps one byte per character, so offsets still match
+                # the line; anything outside it becomes '?' and can't be a digit
+                line_bytes = line.encode('latin-1', errors='replace')
+                numbers = [(m.start(), m.group().decode('ascii')) for m in _NUM_RE.finditer(line_bytes)]
                 
                 print(f"Found {len(numbers)} numeric values:")
                 for pos, num in numbers:
@@ -94,64 +139,45 @@ def analyze_comprehensive_structure(pdf_path, page_num=3):
 def find_missing_rows(pdf_path):
     """Identify which rows might be getting filtered out"""
     
-    with pdfplumber.open(pdf_path) as pdf:
-        all_rows = []
-        
-        for page_num in range(3, len(pdf.pages)):
-            page = pdf.pages[page_num]
-            text = page.extract_text()
-            if text:
-                lines = text.split('\n')
-                for line in lines:
-                    if re.match(r'^\d{8}', line.strip()):
-                        # Extract key fields for duplicate analysis
-                        parts = line.split()
-                        if len(parts) > 5:
-                            ticket = parts[0]
-                            # Try to find CPT code (5 digits)
-                            cpt = None
-                            for part in parts:
-                                if re.match(r'^\d{5}$', part):
-                                    cpt = part
-                                    break
-                            
-                            # Try to find date
-                            date = None
-                            date_match = re.search(r'\d{1,2}/\d{1,2}/\d{2}', line)
-                            if date_match:
-                                date = date_match.group()
-                            
-                            all_rows.append({
-                                'line': line[:100] + '...' if len(line) > 100 else line,
-                                'ticket': ticket,
-                                'cpt': cpt,
-                                'date': date,
-                                'page': page_num + 1
-                            })
-        
-        print(f"\n\n=== DUPLICATE ANALYSIS ===")
-        print(f"Total rows found: {len(all_rows)}")
-        
-        # Group by composite key
-        from collections import defaultdict
-        grouped = defaultdict(list)
-        for row in all_rows:
-            key = (row['ticket'], row['cpt'], row['date'])
-            grouped[key].append(row)
-        
-        print(f"Unique composite keys: {len(grouped)}")
-        
-        # Show duplicates
-        print("\nRows that share the same (ticket, cpt, date):")
-        dup_count = 0
-        for key, rows in grouped.items():
-            if len(rows) > 1:
-                dup_count += len(rows) - 1
-                print(f"\nKey: {key}")
-                for row in rows:
-                    print(f"  Page {row['page']}: {row['line']}")
-        
-        print(f"\nTotal duplicate rows that would be filtered: {dup_count}")
+    all_rows = []
+    
+    for page_num, text in _page_texts(pdf_path, start=3):
+        if text:
+            lines = text.splitlines()
+            for line in lines:
+                if _starts_with_8_digits(line):
+                    # Extract key fields for duplicate analysis
+                    match = _ROW_RE.match(line)
+                    if match:
+                        ticket, cpt, date = match.group('ticket', 'cpt', 'date')
+                        all_rows.append({
+                            'line': line[:100] + '...' if len(line) > 100 else line,
+                            'ticket': ticket,
+                            'cpt': cpt,
+                            'date': date,
+                            'page': page_num + 1
+                        })
+    
+    print(f"\n\n=== DUPLICATE ANALYSIS ===")
+    print(f"Total rows found: {len(all_rows)}")
+    
+    # Group by composite key
+    key_cols = ['ticket', 'cpt', 'date']
+    df = pd.DataFrame(all_rows, columns=['line', 'ticket', 'cpt', 'date', 'page'])
+    key_sizes = df.groupby(key_cols, sort=False, dropna=False).size()
+    
+    print(f"Unique composite keys: {len(key_sizes)}")
+    
+    # Show duplicates
+    print("\nRows that share the same (ticket, cpt, date):")
+    duplicates = df[df.duplicated(key_cols, keep=False)]
+    for key, rows in duplicates.groupby(key_cols, sort=False, dropna=False):
+        print(f"\nKey: {key}")
+        for row in rows.itertuples(index=False):
+            print(f"  Page {row.page}: {row.line}")
+    
+    dup_count = int((key_sizes[key_sizes > 1] - 1).sum())
+    print(f"\nTotal duplicate rows that would be filtered: {dup_count}")
 
 if __name__ == "__main__":
     pdf_path = "data/archive/20250613-614-Compensation_Reports_unlocked.pdf"
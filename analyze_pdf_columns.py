@@ -6,12 +6,13 @@ import pdfplumber
 def analyze_pdf_structure(pdf_path, page_num=3):
     """Analyze the structure of charge transaction data in the PDF"""
     
-    with pdfplumber.open(pdf_path) as pdf:
-        if page_num >= len(pdf.pages):
+    # Only materialize the requested page (pdfplumber page numbers are 1-based)
+    with pdfplumber.open(pdf_path, pages=[page_num + 1]) as pdf:
+        if not pdf.pages:
             print(f"Page {page_num + 1} not found")
             return
         
-        page = pdf.pages[page_num]
+        page = pdf.pages[0]
         text = page.extract_text()
         
         if not text:
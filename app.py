@@ -1,49 +1,205 @@
 import os
+import calendar
+import csv
+import io
 import secrets
-from flask import Flask, render_template, request, redirect, url_for, flash, jsonify
+import shutil
+import tempfile
+import time
+from datetime import datetime
+from flask import Flask, Response, render_template, stream_template, request, redirect, url_for, flash, get_flashed_messages, jsonify
+from flask.json.provider import DefaultJSONProvider
 from werkzeug.utils import secure_filename
 from pathlib import Path
-import traceback
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+import orjson
 import pandas as pd
+from sqlalchemy import text
 
 from process_reports import ReportProcessor
 from data_analyzer import CompensationAnalyzer
-from database_models import get_session, MonthlySummary, ChargeTransaction, AnesthesiaCase
+from case_grouper import CaseGrouper
+from asmg_calculator import ASMGCalculator
+from database_models import engine, get_session, Session, MonthlySummary, ChargeTransaction, AnesthesiaCase, MasterCase
 
 # Configuration
 UPLOAD_FOLDER = 'data'
+UPLOAD_DIR = Path(UPLOAD_FOLDER)
 ALLOWED_EXTENSIONS = {'pdf'}
+_ALLOWED_SUFFIXES = tuple('.' + ext for ext in ALLOWED_EXTENSIONS)
+_MONTH_NAMES = tuple(calendar.month_name)
+PAGE_SIZE = 500  # rows per page on /tickets and /cases
+_CSV_CHUNK_SIZE = 64 * 1024  # characters per chunk of a streamed CSV export
+REPORTS_DIR = Path('static/reports')
+# Processed uploads are moved here, whichever job directory they were saved in
+ARCHIVE_DIR = UPLOAD_DIR / 'archive'
+
+# Create the working directories once at startup rather than per request
+UPLOAD_DIR.mkdir(exist_ok=True)
+REPORTS_DIR.mkdir(parents=True, exist_ok=True)
+
+# Columns /tickets and /cases may be sorted by
+_TICKET_SORTS = frozenset(c.name for c in ChargeTransaction.__table__.columns)
+_CASE_SORTS = frozenset(c.name for c in MasterCase.__table__.columns)
+# Transaction columns shown on the tickets page
+_TICKET_COLUMNS = tuple(c.name for c in ChargeTransaction.__table__.columns
+                        if c.name not in ('id', 'summary_id', 'master_case_id', 'created_at'))
+
+# Chart file -> CompensationAnalyzer method that draws it
+_PLOTS = {
+    'income_trend.png': 'plot_income_trend',
+    'seasonal_trends.png': 'plot_seasonal_trends',
+    'procedure_profitability.png': 'plot_procedure_profitability',
+    'payer_performance.png': 'plot_payer_performance',
+}
+# Chart name -> CompensationAnalyzer method and arguments returning the data
+# it is drawn from, with the same top-N cut as the PNG
+_CHART_DATA = {
+    'income_trend': ('get_monthly_income_trend', {}),
+    'seasonal_trends': ('get_seasonal_trends', {}),
+    'procedure_profitability': ('get_procedure_profitability', {'limit': 15}),
+    'payer_performance': ('get_payer_performance', {'limit': 10}),
+}
+# Data fingerprint the charts in REPORTS_DIR were last drawn from
+_CHARTS_FINGERPRINT = REPORTS_DIR / '.fingerprint'
+
+class OrjsonJSONProvider(DefaultJSONProvider):
+    """Flask JSON provider backed by orjson.
+
+    Keeps Flask's conventions (sorted keys, HTTP dates for datetimes, indented
+    output in debug mode) and also serializes numpy values and non-string keys
+    coming out of the analyzer.
+    """
+
+    _OPTIONS = (orjson.OPT_SORT_KEYS | orjson.OPT_NON_STR_KEYS
+                | orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_PASSTHROUGH_DATETIME)
+
+    @staticmethod
+    def default(o):
+        # Missing dates in analyzer DataFrames come through as NaT
+        if o is pd.NaT:
+            return None
+        return DefaultJSONProvider.default(o)
+
+    def _encode(self, obj, indent=False):
+        option = self._OPTIONS | (orjson.OPT_INDENT_2 if indent else 0)
+        return orjson.dumps(obj, default=self.default, option=option)
+
+    def dumps(self, obj, **kwargs):
+        return self._encode(obj, indent=bool(kwargs.get('indent'))).decode()
+
+    def loads(self, s, **kwargs):
+        return orjson.loads(s)
+
+    def response(self, *args, **kwargs):
+        obj = self._prepare_response_obj(args, kwargs)
+        indent = self.compact is False or (self.compact is None and self._app.debug)
+        return self._app.response_class(self._encode(obj, indent) + b"\n", mimetype=self.mimetype)
 
 # Initialize Flask App
 app = Flask(__name__)
+app.json = OrjsonJSONProvider(app)
+# Never evict compiled templates. Outside debug mode Flask already skips the
+# per-request template stat() (TEMPLATES_AUTO_RELOAD follows app.debug).
+app.jinja_options = {**app.jinja_options, 'cache_size': -1}
 app.config['UPLOAD_FOLDER'] = UPLOAD_FOLDER
+# Static files are only the generated charts; let browsers reuse them briefly
+app.config['SEND_FILE_MAX_AGE_DEFAULT'] = 300
 # Use environment variable for secret key, or generate a random one
 app.secret_key = os.environ.get('SECRET_KEY') or secrets.token_hex(32)
 
+# Uploads and bulk deletes run off the request thread. One worker, because
+# jobs rewrite whole tables and SQLite allows a single writer anyway.
+_EXECUTOR = ThreadPoolExecutor(max_workers=1)
+_JOBS = {}  # job id -> (description, Future)
+_JOB_FINISHED_AT = {}  # job id -> time.monotonic() when the job finished
+_JOB_RETENTION = 3600  # seconds a finished job's result waits to be collected from /status
+
+# Shared analyzer; its read methods are memoized until the database changes
+_ANALYZER = CompensationAnalyzer()
+
+@app.teardown_appcontext
+def _remove_session(exc=None):
+    """Release this thread's scoped database session after each request."""
+    Session.remove()
+
+def _invalidate_analyzer_cache():
+    """Drop memoized analyzer results after uploads or deletions."""
+    _ANALYZER.invalidate()
+    # Make /analysis redraw the charts even if the fingerprint comes out equal
+    _CHARTS_FINGERPRINT.unlink(missing_ok=True)
+
 # Custom template filter for month names
 @app.template_filter('month_name')
 def month_name(month_number):
     """Convert month number to month name."""
-    import calendar
-    return calendar.month_name[month_number]
+    return _MONTH_NAMES[month_number]
+
+def _stream_page(template_name, **context):
+    """Render a large page as a stream so the first bytes go out right away."""
+    # The session cookie is written before a streamed body renders, so pop
+    # flashed messages now; base.html then reads them from the request cache.
+    get_flashed_messages()
+    return stream_template(template_name, **context)
+
+def _df_records(df):
+    """Rows of df as dicts, like to_dict(orient='records') but column-wise.
+
+    Each column is converted to Python objects once and the rows are zipped
+    together, instead of pandas boxing every cell individually.
+    """
+    columns = list(df.columns)
+    arrays = [df[col].to_numpy(dtype=object) for col in columns]
+    return [dict(zip(columns, row)) for row in zip(*arrays)]
+
+def _save_upload(file, path):
+    """Write an uploaded file to path in 1 MiB chunks.
+
+    FileStorage.save() copies through a 16 KiB buffer, which means many
+    small reads and writes for multi-megabyte report PDFs.
+    """
+    with open(path, 'wb', buffering=1 << 20) as out:
+        shutil.copyfileobj(file.stream, out, length=1 << 20)
+
+def _page_args(sorts, default_sort, default_order, total_count, per_page):
+    """Read sort_by, sort_order and page from the query string.
+
+    Anything that isn't a sortable column or a valid direction falls back to
+    the defaults, and the page is clamped to the pages that exist.
+    Returns (sort_by, sort_order, page, page_count).
+    """
+    sort_by = request.args.get('sort_by', default_sort)
+    if sort_by not in sorts:
+        sort_by = default_sort
+    sort_order = request.args.get('sort_order', default_order).lower()
+    if sort_order not in ('asc', 'desc'):
+        sort_order = default_order
+
+    page_count = -(-total_count // per_page)
+    page = min(max(request.args.get('page', 0, type=int), 0), max(page_count - 1, 0))
+    return sort_by, sort_order, page, page_count
+
+def _api_page_size():
+    """per_page from the query string, between 1 and PAGE_SIZE."""
+    return min(max(request.args.get('per_page', PAGE_SIZE, type=int), 1), PAGE_SIZE)
 
 def allowed_file(filename):
     """Check if the file has an allowed extension."""
-    return '.' in filename and \
-           filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
+    return filename.lower().endswith(_ALLOWED_SUFFIXES)
 
 @app.route('/')
 def index():
     """Main dashboard page - clean overview."""
     try:
-        analyzer = CompensationAnalyzer()
+        analyzer = _ANALYZER
         
         # Get basic summary statistics
         summary_stats = analyzer.get_summary_statistics()
         
         return render_template('dashboard.html', stats=summary_stats)
     except Exception as e:
-        app.logger.error(f"Dashboard error: {str(e)}\n{traceback.format_exc()}")
+        app.logger.exception("Dashboard error")
         flash(f"Error loading dashboard: {str(e)}", 'danger')
         return render_template('dashboard.html', stats={})
 
@@ -51,15 +207,15 @@ def index():
 def compensation():
     """Compensation data page."""
     try:
-        analyzer = CompensationAnalyzer()
+        analyzer = _ANALYZER
         
         # Get monthly summary data
         summary_df = analyzer.get_monthly_income_trend()
         
         return render_template('compensation.html',
-                             summary_data=summary_df.to_dict(orient='records') if not summary_df.empty else [])
+                             summary_data=_df_records(summary_df))
     except Exception as e:
-        app.logger.error(f"Compensation page error: {str(e)}\n{traceback.format_exc()}")
+        app.logger.exception("Compensation page error")
         flash(f"Error loading compensation data: {str(e)}", 'danger')
         return render_template('compensation.html', summary_data=[])
 
@@ -67,21 +223,24 @@ def compensation():
 def cases():
     """Master cases page."""
     try:
-        analyzer = CompensationAnalyzer()
+        analyzer = _ANALYZER
         
-        # Get sorting parameters from request
-        sort_by = request.args.get('sort_by', 'date_of_service')
-        sort_order = request.args.get('sort_order', 'desc')
+        sort_by, sort_order, page, page_count = _page_args(
+            _CASE_SORTS, 'date_of_service', 'desc',
+            analyzer.get_master_case_count(), PAGE_SIZE)
 
-        # Fetch and sort data
-        cases_df = analyzer.get_master_cases(sort_by=sort_by, sort_order=sort_order)
+        # Fetch one sorted page of data
+        cases_df = analyzer.get_master_cases(sort_by=sort_by, sort_order=sort_order,
+                                             page=page, per_page=PAGE_SIZE)
         
-        return render_template('cases.html', 
-                             cases_data=cases_df.to_dict(orient='records') if not cases_df.empty else [],
-                             sort_by=sort_by,
-                             sort_order=sort_order)
+        return _stream_page('cases.html',
+                            cases_data=list(cases_df.itertuples(index=False)),
+                            sort_by=sort_by,
+                            sort_order=sort_order,
+                            page=page,
+                            page_count=page_count)
     except Exception as e:
-        app.logger.error(f"Cases page error: {str(e)}\n{traceback.format_exc()}")
+        app.logger.exception("Cases page error")
         flash(f"Error loading master cases: {str(e)}", 'danger')
         return render_template('cases.html', cases_data=[], sort_by='date_of_service', sort_order='desc')
 
@@ -89,79 +248,260 @@ def cases():
 def tickets():
     """Ticket/transaction data page with sorting."""
     try:
-        analyzer = CompensationAnalyzer()
+        analyzer = _ANALYZER
         
-        # Get sorting parameters from request
-        sort_by = request.args.get('sort_by', 'phys_ticket_ref')
-        sort_order = request.args.get('sort_order', 'asc')
-
-        # Fetch and sort data
-        transactions_df = analyzer.get_charge_transactions(sort_by=sort_by, sort_order=sort_order)
-
-        return render_template('tickets.html',
-                             transactions_data=transactions_df.to_dict(orient='records') if not transactions_df.empty else [],
-                             sort_by=sort_by,
-                             sort_order=sort_order)
+        total_count = analyzer.get_charge_transaction_count()
+        sort_by, sort_order, page, page_count = _page_args(
+            _TICKET_SORTS, 'phys_ticket_ref', 'asc', total_count, PAGE_SIZE)
+
+        # Fetch one sorted page of data
+        transactions_df = analyzer.get_charge_transactions(columns=_TICKET_COLUMNS,
+                                                           sort_by=sort_by, sort_order=sort_order,
+                                                           page=page, per_page=PAGE_SIZE)
+
+        return _stream_page('tickets.html',
+                            transactions_data=list(transactions_df.itertuples(index=False)),
+                            total_count=total_count,
+                            totals=analyzer.get_charge_transaction_totals(),
+                            sort_by=sort_by,
+                            sort_order=sort_order,
+                            page=page,
+                            page_count=page_count)
     except Exception as e:
-        app.logger.error(f"Tickets page error: {str(e)}\n{traceback.format_exc()}")
+        app.logger.exception("Tickets page error")
         flash(f"Error loading ticket data: {str(e)}", 'danger')
         return render_template('tickets.html', transactions_data=[], sort_by='phys_ticket_ref', sort_order='asc')
 
+@app.route('/api/cases.json')
+def api_cases():
+    """One sorted page of master cases as JSON, for loading tables lazily."""
+    try:
+        analyzer = _ANALYZER
+        per_page = _api_page_size()
+        total_count = analyzer.get_master_case_count()
+        sort_by, sort_order, page, page_count = _page_args(
+            _CASE_SORTS, 'date_of_service', 'desc', total_count, per_page)
+
+        cases_df = analyzer.get_master_cases(sort_by=sort_by, sort_order=sort_order,
+                                             page=page, per_page=per_page)
+
+        return jsonify({
+            'data': _df_records(cases_df),
+            'page': page,
+            'page_count': page_count,
+            'per_page': per_page,
+            'total_count': total_count,
+            'sort_by': sort_by,
+            'sort_order': sort_order
+        })
+    except Exception as e:
+        app.logger.exception("Cases API error")
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/tickets.json')
+def api_tickets():
+    """One sorted page of charge transactions as JSON, for loading tables lazily."""
+    try:
+        analyzer = _ANALYZER
+        per_page = _api_page_size()
+        total_count = analyzer.get_charge_transaction_count()
+        sort_by, sort_order, page, page_count = _page_args(
+            _TICKET_SORTS, 'phys_ticket_ref', 'asc', total_count, per_page)
+
+        transactions_df = analyzer.get_charge_transactions(sort_by=sort_by, sort_order=sort_order,
+                                                           page=page, per_page=per_page)
+
+        return jsonify({
+            'data': _df_records(transactions_df),
+            'page': page,
+            'page_count': page_count,
+            'per_page': per_page,
+            'total_count': total_count,
+            'sort_by': sort_by,
+            'sort_order': sort_order
+        })
+    except Exception as e:
+        app.logger.exception("Tickets API error")
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/charts/<name>.json')
+def api_chart_data(name):
+    """The rows a dashboard chart is drawn from, for rendering it in the browser."""
+    if name not in _CHART_DATA:
+        return jsonify({'error': f"Unknown chart: {name}"}), 404
+    try:
+        method, kwargs = _CHART_DATA[name]
+        df = getattr(_ANALYZER, method)(**kwargs)
+        return jsonify({'data': _df_records(df)})
+    except Exception as e:
+        app.logger.exception("Chart data API error")
+        return jsonify({'error': str(e)}), 500
+
 @app.route('/analysis')
 def analysis():
     """Analysis and charts page."""
     try:
-        analyzer = CompensationAnalyzer()
+        analyzer = _ANALYZER
 
-        # Generate plots and save them
-        reports_dir = Path('static/reports')
-        reports_dir.mkdir(exist_ok=True)
+        # Regenerate charts only when they are missing or were drawn from
+        # different data than is in the database now
+        fingerprint = analyzer.get_data_fingerprint()
 
-        # Generate charts
         try:
-            analyzer.plot_income_trend(save_path=str(reports_dir / 'income_trend.png'))
-            analyzer.plot_seasonal_trends(save_path=str(reports_dir / 'seasonal_trends.png'))
-            analyzer.plot_procedure_profitability(save_path=str(reports_dir / 'procedure_profitability.png'))
-            analyzer.plot_payer_performance(save_path=str(reports_dir / 'payer_performance.png'))
+            try:
+                data_changed = _CHARTS_FINGERPRINT.read_text() != fingerprint
+            except FileNotFoundError:
+                data_changed = True
+            stale = [(plot_method, REPORTS_DIR / filename)
+                     for filename, plot_method in _PLOTS.items()
+                     if data_changed or not (REPORTS_DIR / filename).exists()]
+            # Each thread draws on its own Figure, so plots can render side
+            # by side; PNG encoding releases the GIL, so use up to one per core
+            if stale:
+                workers = min(len(stale), os.cpu_count() or 1)
+                with ThreadPoolExecutor(max_workers=workers) as executor:
+                    futures = [executor.submit(getattr(analyzer, plot_method), save_path=str(png_path))
+                               for plot_method, png_path in stale]
+                    for future in futures:
+                        future.result()
+                if fingerprint:
+                    _CHARTS_FINGERPRINT.write_text(fingerprint)
         except Exception as chart_error:
-            app.logger.warning(f"Error generating charts: {str(chart_error)}")
+            app.logger.warning("Error generating charts: %s", chart_error)
 
         # Get master case analysis
         master_case_analysis = analyzer.get_master_case_analysis()
         
-        # Debug output
-        app.logger.info(f"Master case analysis result: {master_case_analysis}")
-        app.logger.info(f"Type of master_case_analysis: {type(master_case_analysis)}")
+        # Debug output; %-style arguments so the (large) result is only
+        # formatted when debug logging is actually enabled
         if master_case_analysis:
-            app.logger.info(f"Total cases: {master_case_analysis.get('total_cases', 'N/A')}")
-            app.logger.info(f"Keys in master_case_analysis: {list(master_case_analysis.keys()) if isinstance(master_case_analysis, dict) else 'Not a dict'}")
+            app.logger.debug("Master case analysis result: %s", master_case_analysis)
+            app.logger.debug("Total cases: %s", master_case_analysis.get('total_cases', 'N/A'))
         else:
             app.logger.warning("master_case_analysis is None or empty")
 
         return render_template('analysis.html', mca=master_case_analysis)
     except Exception as e:
-        app.logger.error(f"Analysis page error: {str(e)}\n{traceback.format_exc()}")
+        app.logger.exception("Analysis page error")
         flash(f"Error generating analysis: {str(e)}", 'danger')
         return render_template('analysis.html', mca={})
 
-def regenerate_master_cases():
-    """Clear and rebuild master cases from all transactions."""
-    from case_grouper import CaseGrouper
-    from database_models import get_session, MasterCase
+def master_case_statistics():
+    """Case statistics after an upload.
+
+    Loading a report already rebuilds the master cases for the tickets it
+    touched, so there is no need to clear and regenerate them all here.
+    """
     session = get_session()
     try:
-        grouper = CaseGrouper(session)
+        return CaseGrouper(session).get_case_statistics()
+    except Exception as e:
+        app.logger.error("Error reading master case statistics: %s", e)
+        return None
+    finally:
+        session.close()
+
+def _upload_dir():
+    """A new directory for one job's uploads, so same-named files never overwrite each other."""
+    return Path(tempfile.mkdtemp(prefix='upload-', dir=UPLOAD_DIR))
+
+def _remove_upload_dir(upload_dir):
+    """Remove a job's upload directory once processing has archived its files.
+
+    Files that failed to process are left in it.
+    """
+    try:
+        upload_dir.rmdir()
+    except OSError:
+        pass
+
+def _process_upload(filename, file_path):
+    """Background job for /upload; returns the flash messages to show."""
+    try:
+        # Process the uploaded file
+        processor = ReportProcessor(archive_processed=True, archive_dir=ARCHIVE_DIR)
+        success = processor.process_single_file(file_path)
+        
+        if success:
+            stats = master_case_statistics()
+            return [(f'File "{filename}" uploaded and processed successfully! Master cases updated ({(stats or {}).get("total_cases", 0)} cases).', 'success')]
+        else:
+            return [(f'Error processing file "{filename}". Check logs for details.', 'danger')]
+    except Exception as e:
+        app.logger.exception("Upload processing error")
+        return [(f'Error processing file "{filename}": {str(e)}', 'danger')]
+    finally:
+        _remove_upload_dir(Path(file_path).parent)
+        _invalidate_analyzer_cache()
+
+def _process_batch_upload(upload_dir, saved_files, failed_files):
+    """Background job for /batch_upload; returns the flash messages to show."""
+    successful_files = []
+    failed_files = list(failed_files)
+    
+    try:
+        # Parse the files in parallel; they are loaded into the database one by one
+        processor = ReportProcessor(archive_processed=True, archive_dir=ARCHIVE_DIR)
+        results = processor.process_files([filepath for _, filepath in saved_files])
+        for filename, filepath in saved_files:
+            if results.get(filepath):
+                successful_files.append(filename)
+            else:
+                failed_files.append(filename)
+        
+        stats = master_case_statistics()
+        messages = [(f'Batch processing completed: {len(successful_files)} successful, {len(failed_files)} failed. Master cases updated ({(stats or {}).get("total_cases", 0)} cases).', 'success')]
+        if successful_files:
+            messages.append((f'Successfully processed: {", ".join(successful_files)}', 'success'))
+        if failed_files:
+            messages.append((f'Failed to process: {", ".join(failed_files)}', 'danger'))
+        return messages
+            
+    except Exception as e:
+        app.logger.exception("Batch upload error")
+        return [(f'Error during batch processing: {str(e)}', 'danger')]
+    finally:
+        _remove_upload_dir(upload_dir)
+        _invalidate_analyzer_cache()
+
+def _delete_all_data():
+    """Background job for /delete; returns the flash messages to show."""
+    session = get_session()
+    try:
+        session.query(ChargeTransaction).delete(synchronize_session=False)
         session.query(MasterCase).delete(synchronize_session=False)
+        session.query(AnesthesiaCase).delete(synchronize_session=False)
+        session.query(MonthlySummary).delete(synchronize_session=False)
         session.commit()
-        grouper.group_transactions_into_cases()
-        stats = grouper.get_case_statistics()
-        return stats
+        # Hand the freed pages back to the filesystem (VACUUM can't run
+        # inside a transaction)
+        with engine.connect().execution_options(isolation_level='AUTOCOMMIT') as conn:
+            conn.execute(text('VACUUM'))
+        return [('All data has been deleted.', 'success')]
     except Exception as e:
-        import logging
-        logging.getLogger(__name__).error(f"Error regenerating master cases: {str(e)}")
-        return None
+        session.rollback()
+        app.logger.exception("Error deleting all data")
+        return [(f'Error deleting all data: {str(e)}', 'danger')]
     finally:
         session.close()
+        _invalidate_analyzer_cache()
+
+def _evict_finished_jobs():
+    """Forget jobs that finished more than _JOB_RETENTION seconds ago without being collected."""
+    cutoff = time.monotonic() - _JOB_RETENTION
+    for job_id, finished_at in list(_JOB_FINISHED_AT.items()):
+        if finished_at < cutoff:
+            _JOBS.pop(job_id, None)
+            _JOB_FINISHED_AT.pop(job_id, None)
+
+def _submit_job(description, fn, *args):
+    """Run fn on the upload executor and return the id to poll /status with."""
+    _evict_finished_jobs()
+    job_id = uuid.uuid4().hex
+    future = _EXECUTOR.submit(fn, *args)
+    _JOBS[job_id] = (description, future)
+    future.add_done_callback(lambda _: _JOB_FINISHED_AT.setdefault(job_id, time.monotonic()))
+    return job_id
 
 @app.route('/upload', methods=['POST'])
 def upload_file():
@@ -178,25 +518,11 @@ def upload_file():
     
     if file and allowed_file(file.filename):
         filename = secure_filename(file.filename)
-        file_path = os.path.join(app.config['UPLOAD_FOLDER'], filename)
-        file.save(file_path)
+        file_path = str(_upload_dir() / filename)
+        _save_upload(file, file_path)
         
-        try:
-            # Process the uploaded file
-            processor = ReportProcessor(archive_processed=True)
-            success = processor.process_single_file(file_path)
-            
-            if success:
-                # Automatically regenerate master cases
-                stats = regenerate_master_cases()
-                flash(f'File "{filename}" uploaded and processed successfully! Master cases regenerated ({stats["total_cases"]} cases).', 'success')
-            else:
-                flash(f'Error processing file "{filename}". Check logs for details.', 'danger')
-        except Exception as e:
-            app.logger.error(f"Upload processing error: {str(e)}\n{traceback.format_exc()}")
-            flash(f'Error processing file "{filename}": {str(e)}', 'danger')
-            
-        return redirect(url_for('index'))
+        job_id = _submit_job(f'Processing "{filename}"', _process_upload, filename, file_path)
+        return redirect(url_for('job_status', job_id=job_id))
     else:
         flash('Invalid file type. Please upload a PDF.', 'danger')
         return redirect(url_for('index'))
@@ -213,45 +539,62 @@ def batch_upload():
         flash('No files selected', 'warning')
         return redirect(url_for('index'))
     
-    successful_files = []
+    # Uploaded streams only live as long as the request, so save them here
+    upload_dir = _upload_dir()
+    saved_files = []
     failed_files = []
+    for file in files:
+        if file and allowed_file(file.filename):
+            try:
+                filename = secure_filename(file.filename)
+                filepath = str(upload_dir / filename)
+                _save_upload(file, filepath)
+                saved_files.append((filename, filepath))
+            except Exception as e:
+                app.logger.error("Batch upload error for %s: %s", file.filename, e)
+                failed_files.append(file.filename)
+        else:
+            failed_files.append(file.filename)
+    
+    job_id = _submit_job(f'Processing {len(saved_files)} file(s)', _process_batch_upload,
+                         upload_dir, saved_files, failed_files)
+    return redirect(url_for('job_status', job_id=job_id))
+
+@app.route('/status/<job_id>')
+def job_status(job_id):
+    """Report on a background upload or delete job.
+
+    Returns 202 while the job is running. Once it has finished, browsers get
+    its messages flashed and are sent back to the dashboard; JSON clients get
+    the messages in the response body.
+    """
+    _evict_finished_jobs()
+    job = _JOBS.get(job_id)
+    if job is None:
+        if request.accept_mimetypes.best == 'application/json':
+            return jsonify({'error': 'Unknown job'}), 404
+        flash('Job not found.', 'warning')
+        return redirect(url_for('index'))
+    
+    description, future = job
+    if not future.done():
+        if request.accept_mimetypes.best == 'application/json':
+            return jsonify({'status': 'running', 'description': description}), 202
+        return render_template('job_status.html', description=description), 202
     
+    _JOBS.pop(job_id, None)
+    _JOB_FINISHED_AT.pop(job_id, None)
     try:
-        for file in files:
-            if file and allowed_file(file.filename):
-                try:
-                    # Save file temporarily
-                    filename = secure_filename(file.filename)
-                    filepath = os.path.join(app.config['UPLOAD_FOLDER'], filename)
-                    file.save(filepath)
-                    
-                    # Process the file
-                    processor = ReportProcessor(archive_processed=True)
-                    success = processor.process_single_file(filepath)
-                    
-                    if success:
-                        successful_files.append(filename)
-                    else:
-                        failed_files.append(filename)
-                        
-                except Exception as e:
-                    app.logger.error(f"Batch upload error for {file.filename}: {str(e)}")
-                    failed_files.append(file.filename)
-            else:
-                failed_files.append(file.filename)
-        
-        # Automatically regenerate master cases after batch upload
-        stats = regenerate_master_cases()
-        flash(f'Batch processing completed: {len(successful_files)} successful, {len(failed_files)} failed. Master cases regenerated ({stats["total_cases"]} cases).', 'success')
-        if successful_files:
-            flash(f'Successfully processed: {", ".join(successful_files)}', 'success')
-        if failed_files:
-            flash(f'Failed to process: {", ".join(failed_files)}', 'danger')
-            
+        messages = future.result()
     except Exception as e:
-        app.logger.error(f"Batch upload error: {str(e)}")
-        flash(f'Error during batch processing: {str(e)}', 'danger')
-
+        app.logger.exception("Background job error")
+        messages = [(f'Error during processing: {str(e)}', 'danger')]
+    
+    if request.accept_mimetypes.best == 'application/json':
+        return jsonify({'status': 'done',
+                        'messages': [{'message': m, 'category': c} for m, c in messages]})
+    for message, category in messages:
+        flash(message, category)
     return redirect(url_for('index'))
 
 @app.route('/delete_report/<int:summary_id>', methods=['POST'])
@@ -260,39 +603,52 @@ def delete_report(summary_id):
     session = get_session()
     try:
         # Find the summary record
-        summary = session.query(MonthlySummary).filter_by(id=summary_id).first()
+        summary = session.get(MonthlySummary, summary_id)
         if not summary:
             flash('Report not found.', 'danger')
             return redirect(url_for('compensation'))
 
-        # Delete associated records
-        session.query(ChargeTransaction).filter_by(summary_id=summary_id).delete()
-        session.query(AnesthesiaCase).filter_by(summary_id=summary_id).delete()
+        # Remember the report's tickets so their master cases can be rebuilt
+        # from whatever transactions other reports still have for them
+        tickets = {ticket for (ticket,) in session.query(ChargeTransaction.phys_ticket_ref)
+                   .filter_by(summary_id=summary_id).distinct() if ticket}
+
+        # Delete associated records. The foreign keys cascade, but SQLite only
+        # enforces that with PRAGMA foreign_keys on and older databases were
+        # created without it, so remove the children explicitly.
+        session.query(ChargeTransaction).filter_by(summary_id=summary_id).delete(synchronize_session=False)
+        session.query(AnesthesiaCase).filter_by(summary_id=summary_id).delete(synchronize_session=False)
         
         # Delete the summary record
         session.delete(summary)
-        
-        session.commit()
+        session.flush()
+
+        # Regroups in the same transaction and commits it
+        CaseGrouper(session).group_transactions_into_cases(only_tickets=tickets)
+        _invalidate_analyzer_cache()
         flash(f'Report "{summary.source_file}" and all its data have been deleted.', 'success')
     except Exception as e:
         session.rollback()
-        app.logger.error(f"Error deleting report: {str(e)}\n{traceback.format_exc()}")
+        app.logger.exception("Error deleting report")
         flash(f'Error deleting report: {str(e)}', 'danger')
     finally:
         session.close()
         
     return redirect(url_for('compensation'))
 
+# The health check body never changes, so it is serialized once
+_HEALTH_BODY = orjson.dumps({"status": "ok"}) + b"\n"
+
 @app.route('/health')
 def health_check():
     """A simple health check endpoint."""
-    return jsonify({"status": "ok"}), 200
+    return app.response_class(_HEALTH_BODY, status=200, mimetype=app.json.mimetype)
 
 @app.route('/debug_analysis')
 def debug_analysis():
     """Debug endpoint to test analysis data."""
     try:
-        analyzer = CompensationAnalyzer()
+        analyzer = _ANALYZER
         master_case_analysis = analyzer.get_master_case_analysis()
         
         return jsonify({
@@ -310,34 +666,22 @@ def debug_analysis():
 def delete_all_data():
     """Delete all data from the database."""
     if request.method == 'POST':
-        session = get_session()
-        try:
-            session.query(ChargeTransaction).delete()
-            session.query(AnesthesiaCase).delete()
-            session.query(MonthlySummary).delete()
-            session.commit()
-            flash('All data has been deleted.', 'success')
-        except Exception as e:
-            session.rollback()
-            app.logger.error(f"Error deleting all data: {str(e)}\n{traceback.format_exc()}")
-            flash(f'Error deleting all data: {str(e)}', 'danger')
-        finally:
-            session.close()
-        return redirect(url_for('delete_all_data'))
+        job_id = _submit_job('Deleting all data', _delete_all_data)
+        return redirect(url_for('job_status', job_id=job_id))
     return render_template('delete.html')
 
 @app.route('/cpt_codes')
 def cpt_codes():
     """CPT codes page with anesthesia base units and historical tracking."""
     try:
-        analyzer = CompensationAnalyzer()
+        analyzer = _ANALYZER
         
         # Get CPT codes analysis with historical tracking
         cpt_data = analyzer.get_cpt_codes_with_history()
         
         return render_template('cpt_codes.html', cpt_data=cpt_data)
     except Exception as e:
-        app.logger.error(f"CPT codes page error: {str(e)}\n{traceback.format_exc()}")
+        app.logger.exception("CPT codes page error")
         flash(f"Error loading CPT codes data: {str(e)}", 'danger')
         return render_template('cpt_codes.html', cpt_data={})
 
@@ -345,40 +689,31 @@ def cpt_codes():
 def export_cpt_codes():
     """Export CPT codes data as CSV."""
     try:
-        analyzer = CompensationAnalyzer()
+        analyzer = _ANALYZER
         cpt_data = analyzer.get_cpt_codes_with_history()
         
-        # Create CSV data
-        csv_data = []
-        csv_data.append(['CPT Code', 'Current Anesthesia Base Units'])
-        
-        for cpt_code, data in cpt_data.items():
-            current_units = data.get('current_anes_units', 'N/A')
+        # Stream the CSV in ~64 KiB chunks straight from the CSV writer
+        def generate():
+            output = io.StringIO()
+            writer = csv.writer(output)
+            writer.writerow(('CPT Code', 'Current Anesthesia Base Units'))
             
-            csv_data.append([
-                cpt_code,
-                current_units
-            ])
-        
-        # Create CSV response
-        import io
-        import csv
-        from flask import Response
-        
-        output = io.StringIO()
-        writer = csv.writer(output)
-        writer.writerows(csv_data)
-        
-        output.seek(0)
+            for cpt_code, data in cpt_data.items():
+                writer.writerow((cpt_code, data.get('current_anes_units', 'N/A')))
+                if output.tell() >= _CSV_CHUNK_SIZE:
+                    yield output.getvalue()
+                    output.seek(0)
+                    output.truncate()
+            yield output.getvalue()
         
         return Response(
-            output.getvalue(),
+            generate(),
             mimetype='text/csv',
             headers={'Content-Disposition': 'attachment; filename=cpt_codes_analysis.csv'}
         )
         
     except Exception as e:
-        app.logger.error(f"CPT codes export error: {str(e)}\n{traceback.format_exc()}")
+        app.logger.exception("CPT codes export error")
         flash(f"Error exporting CPT codes: {str(e)}", 'danger')
         return redirect(url_for('cpt_codes'))
 
@@ -386,14 +721,12 @@ def export_cpt_codes():
 def asmg_rules():
     """ASMG temporal rules management page."""
     try:
-        from asmg_calculator import ASMGCalculator
-        
         calculator = ASMGCalculator()
         rules = calculator.get_all_rules()
         
         return render_template('asmg_rules.html', rules=rules)
     except Exception as e:
-        app.logger.error(f"ASMG rules page error: {str(e)}\n{traceback.format_exc()}")
+        app.logger.exception("ASMG rules page error")
         flash(f"Error loading ASMG rules: {str(e)}", 'danger')
         return render_template('asmg_rules.html', rules=[])
 
@@ -401,9 +734,6 @@ def asmg_rules():
 def add_asmg_rule():
     """Add or update an ASMG temporal rule."""
     try:
-        from asmg_calculator import ASMGCalculator
-        from datetime import datetime
-        
         # Get form data
         effective_date = datetime.strptime(request.form['effective_date'], '%Y-%m-%d').date()
         anes_units_multiplier = float(request.form['anes_units_multiplier'])
@@ -426,7 +756,7 @@ def add_asmg_rule():
             flash('Error adding ASMG rule. Please try again.', 'danger')
             
     except Exception as e:
-        app.logger.error(f"Error adding ASMG rule: {str(e)}\n{traceback.format_exc()}")
+        app.logger.exception("Error adding ASMG rule")
         flash(f'Error adding ASMG rule: {str(e)}', 'danger')
     
     return redirect(url_for('asmg_rules'))
@@ -435,8 +765,6 @@ def add_asmg_rule():
 def delete_asmg_rule(rule_id):
     """Delete an ASMG temporal rule."""
     try:
-        from asmg_calculator import ASMGCalculator
-        
         calculator = ASMGCalculator()
         success = calculator.delete_rule(rule_id)
         
@@ -446,15 +774,10 @@ def delete_asmg_rule(rule_id):
             flash('Error deleting ASMG rule. Please try again.', 'danger')
             
     except Exception as e:
-        app.logger.error(f"Error deleting ASMG rule: {str(e)}\n{traceback.format_exc()}")
+        app.logger.exception("Error deleting ASMG rule")
         flash(f'Error deleting ASMG rule: {str(e)}', 'danger')
     
     return redirect(url_for('asmg_rules'))
 
 if __name__ == '__main__':
-    # Ensure directories exist
-    Path('static').mkdir(exist_ok=True)
-    Path('static/reports').mkdir(exist_ok=True)
-    Path('data').mkdir(exist_ok=True)
-    
     app.run(debug=True, port=8888)
\ No newline at end of file
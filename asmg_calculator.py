@@ -4,9 +4,13 @@ ASMG Units Calculator
 Calculates ASMG units based on temporal rules and case data.
 """
 
+from bisect import bisect_right
 from datetime import datetime, date
 from typing import Optional
-from database_models import get_session, ASMGTemporalRules
+import numpy as np
+from sqlalchemy import func
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from database_models import Session, ASMGTemporalRules
 import logging
 
 logger = logging.getLogger(__name__)
@@ -15,7 +19,43 @@ class ASMGCalculator:
     """Calculates ASMG units based on temporal rules."""
     
     def __init__(self, session=None):
-        self.session = session or get_session()
+        # Defaults to the thread's scoped session, which callers don't close
+        self.session = session or Session()
+        # Rules sorted by effective_date, loaded on first lookup
+        self._rules = None
+        self._dates = None
+        self._rule_arrays = None
+    
+    def _load_rules(self):
+        """Load all rules once, ordered by effective date, for bisect lookups."""
+        self._rules = self.session.query(ASMGTemporalRules).order_by(
+            ASMGTemporalRules.effective_date
+        ).all()
+        self._dates = [rule.effective_date for rule in self._rules]
+        self._rule_arrays = None
+    
+    def _get_rule_arrays(self):
+        """Rule dates and coefficients as aligned arrays for batch calculations."""
+        if self._rules is None:
+            self._load_rules()
+        if self._rule_arrays is None:
+            rules = self._rules
+            self._rule_arrays = (
+                np.array(self._dates, dtype='datetime64[D]'),
+                np.array([r.anes_units_multiplier for r in rules], dtype=np.float64),
+                np.array([r.anes_time_divisor for r in rules], dtype=np.float64),
+                np.array([r.med_units_multiplier for r in rules], dtype=np.float64),
+            )
+        return self._rule_arrays
+    
+    def preload_all_rates(self):
+        """Fetch every rule into memory now, so later lookups never query the database."""
+        self._load_rules()
+    
+    def _invalidate_rules(self):
+        self._rules = None
+        self._dates = None
+        self._rule_arrays = None
     
     def get_applicable_rule(self, case_date: date) -> Optional[ASMGTemporalRules]:
         """
@@ -23,12 +63,14 @@ class ASMGCalculator:
         Returns the rule with the most recent effective_date that is <= case_date.
         """
         try:
-            # Get the most recent rule that is effective on or before the case date
-            rule = self.session.query(ASMGTemporalRules).filter(
-                ASMGTemporalRules.effective_date <= case_date
-            ).order_by(ASMGTemporalRules.effective_date.desc()).first()
+            if self._rules is None:
+                self._load_rules()
+            if isinstance(case_date, datetime):
+                case_date = case_date.date()
             
-            return rule
+            # Get the most recent rule that is effective on or before the case date
+            i = bisect_right(self._dates, case_date) - 1
+            return self._rules[i] if i >= 0 else None
         except Exception as e:
             logger.error(f"Error getting applicable rule for date {case_date}: {str(e)}")
             return None
@@ -75,6 +117,55 @@ class ASMGCalculator:
             logger.error(f"Error calculating ASMG units: {str(e)}")
             return 0.0
     
+    def calculate_asmg_units_batch(self, dates, total_anes_units, total_anes_time,
+                                   total_med_units) -> np.ndarray:
+        """
+        Calculate ASMG units for many cases at once.
+        
+        Same formula and rule selection as calculate_asmg_units, but looks up
+        the rules with np.searchsorted and evaluates the formula on whole arrays.
+        
+        Args:
+            dates: Dates of service (date, datetime or datetime64 values)
+            total_anes_units: Total anesthesia base units per case
+            total_anes_time: Total anesthesia time in minutes per case
+            total_med_units: Total medical base units per case
+            
+        Returns:
+            np.ndarray: Calculated ASMG units, aligned with the inputs
+        """
+        rule_dates, anes_mult, time_div, med_mult = self._get_rule_arrays()
+        dates = np.asarray(dates, dtype='datetime64[D]')
+        
+        idx = np.searchsorted(rule_dates, dates, side='right') - 1
+        has_rule = idx >= 0
+        if not has_rule.all():
+            logger.warning(f"No ASMG rule found for {int((~has_rule).sum())} dates, using defaults")
+        
+        # Cases before the first rule use the same defaults as calculate_asmg_units
+        safe_idx = np.maximum(idx, 0)
+        if len(rule_dates):
+            anes_mult = np.where(has_rule, anes_mult[safe_idx], 0.5)
+            time_div = np.where(has_rule, time_div[safe_idx], 10.0)
+            med_mult = np.where(has_rule, med_mult[safe_idx], 0.6)
+        else:
+            anes_mult, time_div, med_mult = 0.5, 10.0, 0.6
+        
+        asmg_units = (
+            anes_mult * np.asarray(total_anes_units, dtype=np.float64) +
+            np.asarray(total_anes_time, dtype=np.float64) / time_div +
+            med_mult * np.asarray(total_med_units, dtype=np.float64)
+        )
+        rounded = np.round(asmg_units, 2)
+        # np.round scales by 100 first, which can turn a value just below a
+        # half cent into an exact tie; redo those few with round() so the
+        # results match calculate_asmg_units
+        scaled = asmg_units * 100
+        near_tie = np.abs(scaled - np.floor(scaled) - 0.5) < 1e-6
+        if near_tie.any():
+            rounded[near_tie] = [round(x, 2) for x in asmg_units[near_tie].tolist()]
+        return rounded
+    
     def get_default_rule(self) -> dict:
         """Get the default ASMG calculation rule."""
         return {
@@ -103,6 +194,7 @@ class ASMGCalculator:
                 
                 self.session.add(default_rule)
                 self.session.commit()
+                self._invalidate_rules()
                 logger.info("Initialized default ASMG rules")
             else:
                 logger.info(f"ASMG rules already exist ({existing_rules} rules found)")
@@ -131,30 +223,29 @@ class ASMGCalculator:
             bool: True if successful, False otherwise
         """
         try:
-            # Check if a rule already exists for this date
-            existing_rule = self.session.query(ASMGTemporalRules).filter_by(
-                effective_date=effective_date
-            ).first()
-            
-            if existing_rule:
-                # Update existing rule
-                existing_rule.anes_units_multiplier = anes_units_multiplier
-                existing_rule.anes_time_divisor = anes_time_divisor
-                existing_rule.med_units_multiplier = med_units_multiplier
-                existing_rule.description = description
-                existing_rule.updated_at = datetime.utcnow()
-            else:
-                # Create new rule
-                new_rule = ASMGTemporalRules(
-                    effective_date=effective_date,
-                    anes_units_multiplier=anes_units_multiplier,
-                    anes_time_divisor=anes_time_divisor,
-                    med_units_multiplier=med_units_multiplier,
-                    description=description
-                )
-                self.session.add(new_rule)
+            # Insert, or update the rule already effective on this date, in one statement
+            stmt = sqlite_insert(ASMGTemporalRules).values(
+                effective_date=effective_date,
+                anes_units_multiplier=anes_units_multiplier,
+                anes_time_divisor=anes_time_divisor,
+                med_units_multiplier=med_units_multiplier,
+                description=description
+            )
+            stmt = stmt.on_conflict_do_update(
+                index_elements=[ASMGTemporalRules.effective_date],
+                set_={
+                    'anes_units_multiplier': stmt.excluded.anes_units_multiplier,
+                    'anes_time_divisor': stmt.excluded.anes_time_divisor,
+                    'med_units_multiplier': stmt.excluded.med_units_multiplier,
+                    'description': stmt.excluded.description,
+                    # onupdate doesn't apply to ON CONFLICT updates
+                    'updated_at': func.now()
+                }
+            )
+            self.session.execute(stmt)
             
             self.session.commit()
+            self._invalidate_rules()
             logger.info(f"Successfully added/updated ASMG rule for {effective_date}")
             return True
             
@@ -175,6 +266,7 @@ class ASMGCalculator:
             if rule:
                 self.session.delete(rule)
                 self.session.commit()
+                self._invalidate_rules()
                 logger.info(f"Successfully deleted ASMG rule {rule_id}")
                 return True
             else:
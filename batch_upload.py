@@ -1,11 +1,11 @@
 #!/usr/bin/env python3
 
 import os
-import glob
+import fnmatch
 from process_reports import ReportProcessor
 from data_loader import DataLoader
 from case_grouper import CaseGrouper
-from database_models import get_session, MasterCase
+from database_models import get_session
 import logging
 
 logging.basicConfig(level=logging.INFO)
@@ -27,6 +27,7 @@ def batch_process_files(file_paths, data_directory="data"):
     failed_files = []
     
     try:
+        paths_to_process = []
         for file_path in file_paths:
             # Handle relative paths
             if not os.path.isabs(file_path):
@@ -39,33 +40,23 @@ def batch_process_files(file_paths, data_directory="data"):
                 failed_files.append((file_path, "File not found"))
                 continue
             
-            logger.info(f"Processing file: {file_path}")
-            
-            try:
-                # Process the file (this handles extraction and loading)
-                success = processor.process_single_file(file_path)
-                
-                if success:
-                    logger.info(f"Successfully processed: {file_path}")
-                    successful_files.append(file_path)
-                else:
-                    logger.error(f"Failed to process: {file_path}")
-                    failed_files.append((file_path, "Processing failed"))
-                    
-            except Exception as e:
-                logger.error(f"Error processing {file_path}: {str(e)}")
-                failed_files.append((file_path, str(e)))
+            paths_to_process.append(file_path)
         
-        # After all files are processed, regenerate master cases
-        logger.info("Regenerating master cases from all transactions...")
-        grouper = CaseGrouper(session)
+        # PDF parsing is CPU-bound, so the files are extracted in parallel
+        # worker processes; the database loads still run one at a time here
+        logger.info(f"Processing {len(paths_to_process)} files")
+        results = processor.process_files(paths_to_process)
         
-        # Clear existing master cases
-        session.query(MasterCase).delete(synchronize_session=False)
-        session.commit()
+        for file_path in paths_to_process:
+            if results.get(file_path):
+                successful_files.append(file_path)
+            else:
+                logger.error(f"Failed to process: {file_path}")
+                failed_files.append((file_path, "Processing failed"))
         
-        # Regenerate from all transactions
-        grouper.group_transactions_into_cases()
+        # Master cases were already rebuilt for each file's tickets as it was
+        # loaded, so there is no need to clear and regenerate them all here
+        grouper = CaseGrouper(session)
         
         # Get final statistics
         stats = grouper.get_case_statistics()
@@ -91,7 +82,17 @@ def process_all_pdfs_in_directory(directory="data", pattern="*.pdf"):
         directory: Directory to scan for PDF files
         pattern: File pattern to match (default: "*.pdf")
     """
-    pdf_files = glob.glob(os.path.join(directory, pattern))
+    if not os.path.isdir(directory):
+        logger.warning(f"No PDF files found in {directory}")
+        return [], [], None
+    
+    # One scandir pass; entries already know whether they are files, and
+    # absolute paths skip the relative-path handling in batch_process_files
+    with os.scandir(os.path.abspath(directory)) as entries:
+        pdf_files = [entry.path for entry in entries
+                     if not entry.name.startswith('.')
+                     and fnmatch.fnmatch(entry.name, pattern)
+                     and entry.is_file()]
     
     if not pdf_files:
         logger.warning(f"No PDF files found in {directory}")
@@ -2,10 +2,15 @@ import logging
 from datetime import datetime, date, timedelta
 from sqlalchemy.orm import sessionmaker
 from database_models import get_session, ChargeTransaction, MasterCase
-from sqlalchemy import and_
+from asmg_calculator import ASMGCalculator
+from sqlalchemy import and_, case, cast, delete, exists, func, select, update, Float, String
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
 
 logger = logging.getLogger(__name__)
 
+# Joins a ticket's CPT codes in SQL; a control character no code contains
+_CODE_SEPARATOR = '\x1f'
+
 class CaseGrouper:
     """
     Groups charge transactions into master cases by patient ticket number.
@@ -13,18 +18,30 @@ class CaseGrouper:
     Implements batch processing to handle large datasets efficiently.
     """
 
+    # Summary columns refreshed when a ticket already has a master case
+    _UPSERT_COLUMNS = (
+        'date_of_service', 'cpt_code', 'initial_start_time', 'total_anes_time',
+        'total_anes_base_units', 'total_med_base_units', 'total_other_units',
+        'asmg_units', 'final_ticket_number'
+    )
+
+    # Tickets per IN (...) list when only some tickets are regrouped, the
+    # same chunk size DataLoader uses for its lookups
+    _TICKET_CHUNK = 500
+
     def __init__(self, session, batch_size=1000):
         """
         Initialize the CaseGrouper.
 
         Args:
             session: SQLAlchemy session
-            batch_size: Number of transactions to process in each batch (default: 1000)
+            batch_size: Number of cases written per statement (default: 1000)
         """
         self.session = session
         self.batch_size = batch_size
+        self.calculator = ASMGCalculator(session)
 
-    def group_transactions_into_cases(self):
+    def group_transactions_into_cases(self, only_tickets=None):
         """
         Groups all charge transactions into master cases based on:
         - patient (identified by ticket number within upload)
@@ -33,196 +50,151 @@ class CaseGrouper:
         - initial start time
 
         This process is idempotent and can be re-run.
-        Uses batch processing to handle large datasets efficiently.
-        """
-        # Step 1: Get total count of transactions
-        total_transactions = self.session.query(ChargeTransaction).count()
-        logger.info(f"Processing {total_transactions} transactions in batches of {self.batch_size}")
-
-        # Step 2: Process transactions in batches
-        case_groups = {}
-        offset = 0
-
-        while offset < total_transactions:
-            # Fetch batch of transactions
-            batch = self.session.query(ChargeTransaction).offset(offset).limit(self.batch_size).all()
+        Totals are aggregated by the database, and cases are written and
+        updated in batches of batch_size.
 
-            if not batch:
-                break
-
-            # Group this batch
-            batch_groups = self._group_transactions_by_case_criteria(batch)
-
-            # Merge with existing groups
-            for case_key, transactions in batch_groups.items():
-                if case_key not in case_groups:
-                    case_groups[case_key] = []
-                case_groups[case_key].extend(transactions)
+        Args:
+            only_tickets: Optional collection of ticket numbers; when given,
+                only the cases for these tickets are rebuilt and the rest are
+                left as they are
+        """
+        if only_tickets is not None:
+            only_tickets = list(only_tickets)
+            if not only_tickets:
+                return
+            total_transactions = sum(
+                self.session.query(ChargeTransaction).filter(
+                    ChargeTransaction.phys_ticket_ref.in_(chunk)
+                ).count()
+                for chunk in self._ticket_chunks(only_tickets)
+            )
+        else:
+            total_transactions = self.session.query(ChargeTransaction).count()
+            skipped = self.session.query(ChargeTransaction).filter(
+                (ChargeTransaction.phys_ticket_ref.is_(None)) | (ChargeTransaction.phys_ticket_ref == '')
+            ).count()
+            if skipped:
+                logger.warning(f"Skipping {skipped} transactions - missing ticket reference")
+        logger.info(f"Processing {total_transactions} transactions")
 
-            offset += self.batch_size
-            logger.info(f"Processed {min(offset, total_transactions)}/{total_transactions} transactions")
+        # Create or update MasterCase records and link transactions
+        total_cases = self._create_and_link_master_cases(only_tickets)
 
-        # Step 3: Create or update MasterCase records and link transactions
-        self._create_and_link_master_cases(case_groups)
+        logger.info(f"Successfully grouped {total_transactions} transactions into {total_cases} cases")
 
-        logger.info(f"Successfully grouped {total_transactions} transactions into {len(case_groups)} cases")
+    def _ticket_chunks(self, only_tickets):
+        """only_tickets in slices of _TICKET_CHUNK, or [None] for every ticket."""
+        if only_tickets is None:
+            return [None]
+        return [only_tickets[start:start + self._TICKET_CHUNK]
+                for start in range(0, len(only_tickets), self._TICKET_CHUNK)]
 
-    def _group_transactions_by_case_criteria(self, transactions):
+    def _aggregate_cases(self, only_tickets=None):
         """
-        Groups transactions by ticket number (patient identifier).
-        Each ticket number represents one patient case, which can have multiple CPT codes and time periods.
+        Sums and ranges per ticket number, computed by the database in one pass.
+
+        Returns one row per ticket, in order of the ticket's first transaction:
+        (ticket, anes_time, anes_base_units, med_base_units, other_units,
+        first ISO date of service, dates SQLite couldn't read ('|'-separated),
+        distinct CPT codes (unordered, _CODE_SEPARATOR-separated), earliest
+        start time).
+        Restricted to only_tickets when given.
         """
-        case_groups = {}
+        ct = ChargeTransaction
+        date_of_service = func.date(ct.date_of_service)
         
-        for transaction in transactions:
-            # Skip transactions without required fields
-            if not transaction.phys_ticket_ref:
-                logger.warning(f"Skipping transaction {transaction.id} - missing ticket reference")
-                continue
-            
-            # Use ticket number as the case key (patient identifier)
-            case_key = transaction.phys_ticket_ref
-            
-            if case_key not in case_groups:
-                case_groups[case_key] = []
-            
-            case_groups[case_key].append(transaction)
+        # Each ticket's distinct CPT codes. GROUP_CONCAT's order is arbitrary
+        # (this SQLite has no ORDER BY inside aggregates), so callers sort them
+        ticket_codes = (
+            select(ct.phys_ticket_ref, ct.cpt_code)
+            .where(ct.cpt_code.isnot(None), ct.cpt_code != '')
+            .distinct()
+        )
+        if only_tickets is not None:
+            ticket_codes = ticket_codes.where(ct.phys_ticket_ref.in_(only_tickets))
+        ticket_codes = ticket_codes.subquery()
+        codes = (
+            select(ticket_codes.c.phys_ticket_ref, func.group_concat(ticket_codes.c.cpt_code, _CODE_SEPARATOR).label('cpt_codes'))
+            .group_by(ticket_codes.c.phys_ticket_ref)
+            .subquery()
+        )
         
-        return case_groups
+        stmt = (
+            select(
+                ct.phys_ticket_ref,
+                func.coalesce(func.sum(cast(ct.anes_time_min, Float)), 0.0),
+                func.coalesce(func.sum(cast(ct.anes_base_units, Float)), 0.0),
+                func.coalesce(func.sum(cast(ct.med_base_units, Float)), 0.0),
+                func.coalesce(func.sum(cast(ct.other_units, Float)), 0.0),
+                func.min(date_of_service),
+                func.group_concat(case((date_of_service.is_(None), cast(ct.date_of_service, String))), '|'),
+                func.coalesce(func.min(codes.c.cpt_codes), ''),
+                func.min(func.nullif(ct.start_time, ''))
+            )
+            .outerjoin(codes, codes.c.phys_ticket_ref == ct.phys_ticket_ref)
+            .where(ct.phys_ticket_ref.isnot(None), ct.phys_ticket_ref != '')
+            .group_by(ct.phys_ticket_ref)
+            .order_by(func.min(ct.id))
+        )
+        if only_tickets is not None:
+            stmt = stmt.where(ct.phys_ticket_ref.in_(only_tickets))
+        return self.session.execute(stmt).all()
 
-    def _create_and_link_master_cases(self, case_groups):
+    @staticmethod
+    def _earliest_date(patient_ticket, iso_date, other_dates):
+        """Earliest valid date of service from the aggregated date columns."""
+        valid_dates = [date.fromisoformat(iso_date)] if iso_date else []
+        # Values SQLite couldn't read as dates, e.g. 'mm/dd/yy' strings from the old schema
+        if other_dates:
+            for date_str in other_dates.split('|'):
+                date_str = date_str.strip()
+                if date_str.lower() in ['', 'nan', 'none']:
+                    continue
+                try:
+                    valid_dates.append(datetime.strptime(date_str, '%m/%d/%y').date())
+                except ValueError:
+                    logger.warning(f"Invalid date format for case {patient_ticket}: {date_str}")
+        if not valid_dates:
+            logger.warning(f"No valid dates found for case {patient_ticket}")
+            return None
+        return min(valid_dates)
+
+    def _create_and_link_master_cases(self, only_tickets=None):
         """
         Creates MasterCase records and links the charge transactions.
         Each case represents one patient (ticket number) and can have multiple CPT codes and time periods.
+
+        Args:
+            only_tickets: Optional list of ticket numbers to limit the work to
+
+        Returns:
+            int: Number of cases found
         """
-        # Import ASMGCalculator for calculating ASMG units
-        from asmg_calculator import ASMGCalculator
-        calculator = ASMGCalculator(self.session)
+        # Load the rule table once per run; every case is then priced in memory
+        calculator = self.calculator
+        calculator.preload_all_rates()
         
-        total_cases = len(case_groups)
+        ticket_chunks = self._ticket_chunks(only_tickets)
+        case_rows = [row for chunk in ticket_chunks for row in self._aggregate_cases(chunk)]
+        total_cases = len(case_rows)
         cases_without_dates = 0
         
-        for case_key, transactions in case_groups.items():
-            if not transactions:
-                continue
-            
-            patient_ticket = case_key
-            
-            # Calculate summary fields from all transactions for this ticket
-            total_anes_time = 0.0
-            total_anes_base_units = 0.0
-            total_med_base_units = 0.0
-            total_other_units = 0.0
-            
-            # Collect all unique values for the case
-            all_dates = set()
-            all_cpt_codes = set()
-            all_start_times = []
-            all_stop_times = []
-            ticket_numbers = set()
-            
-            for transaction in transactions:
-                # Sum anesthesia time
-                if transaction.anes_time_min:
-                    try:
-                        total_anes_time += float(transaction.anes_time_min)
-                    except (ValueError, TypeError):
-                        pass
-                
-                # Sum anesthesia base units
-                if transaction.anes_base_units:
-                    try:
-                        total_anes_base_units += float(transaction.anes_base_units)
-                    except (ValueError, TypeError):
-                        pass
-                
-                # Sum medical base units
-                if transaction.med_base_units:
-                    try:
-                        total_med_base_units += float(transaction.med_base_units)
-                    except (ValueError, TypeError):
-                        pass
-                
-                # Sum other units
-                if transaction.other_units:
-                    try:
-                        total_other_units += float(transaction.other_units)
-                    except (ValueError, TypeError):
-                        pass
-                
-                # Collect unique values
-                if transaction.date_of_service:
-                    all_dates.add(transaction.date_of_service)
-                if transaction.cpt_code:
-                    all_cpt_codes.add(transaction.cpt_code)
-                if transaction.start_time:
-                    all_start_times.append(transaction.start_time)
-                if transaction.stop_time:
-                    all_stop_times.append(transaction.stop_time)
-                if transaction.phys_ticket_ref:
-                    ticket_numbers.add(transaction.phys_ticket_ref)
-            
-            # Determine case metadata
+        case_values = []
+        dated_cases = []
+        
+        for (patient_ticket, total_anes_time, total_anes_base_units, total_med_base_units,
+             total_other_units, iso_date, other_dates, cpt_codes, initial_start_time) in case_rows:
             # Use the earliest date if multiple dates exist
             date_of_service = None
-            if all_dates:
-                try:
-                    # Filter out invalid dates (None, empty, or invalid date objects)
-                    valid_dates = []
-                    for date_val in all_dates:
-                        # Skip None or invalid values
-                        if date_val is None:
-                            continue
-
-                        # Handle both date objects (new schema) and strings (old schema)
-                        if isinstance(date_val, (date, datetime)):
-                            # Already a date object
-                            valid_dates.append(date_val.date() if isinstance(date_val, datetime) else date_val)
-                        elif isinstance(date_val, str):
-                            # String format - try to parse
-                            date_str = date_val.strip()
-                            if date_str.lower() in ['', 'nan', 'none']:
-                                continue
-                            try:
-                                date_obj = datetime.strptime(date_str, '%m/%d/%y').date()
-                                valid_dates.append(date_obj)
-                            except ValueError:
-                                logger.warning(f"Invalid date format for case {patient_ticket}: {date_str}")
-
-                    if valid_dates:
-                        date_of_service = min(valid_dates)
-                    else:
-                        logger.warning(f"No valid dates found for case {patient_ticket}")
-                except Exception as e:
-                    logger.warning(f"Error processing dates for case {patient_ticket}: {str(e)}")
+            if iso_date or other_dates:
+                date_of_service = self._earliest_date(patient_ticket, iso_date, other_dates)
             
-            # Combine all CPT codes into a comma-separated list
-            cpt_codes_combined = ', '.join(sorted(all_cpt_codes)) if all_cpt_codes else ''
+            initial_start_time = initial_start_time or ''
             
-            # Find earliest start time and latest stop time
-            initial_start_time = min(all_start_times) if all_start_times else ''
-            latest_stop_time = max(all_stop_times) if all_stop_times else ''
+            # Every transaction in the case shares the ticket number
+            initial_ticket = final_ticket = patient_ticket
             
-            # Get ticket number info
-            initial_ticket = min(ticket_numbers) if ticket_numbers else patient_ticket
-            final_ticket = max(ticket_numbers) if ticket_numbers else patient_ticket
-            
-            # Calculate ASMG units
-            asmg_units = 0.0
-            if date_of_service and isinstance(date_of_service, (date, datetime)):
-                try:
-                    # Convert to date if it's a datetime
-                    case_date = date_of_service.date() if isinstance(date_of_service, datetime) else date_of_service
-                    asmg_units = calculator.calculate_asmg_units(
-                        case_date=case_date,
-                        total_anes_units=total_anes_base_units,
-                        total_anes_time=total_anes_time,
-                        total_med_units=total_med_base_units
-                    )
-                except Exception as e:
-                    logger.warning(f"Error calculating ASMG units for case {patient_ticket}: {str(e)}")
-                    asmg_units = 0.0
-            else:
+            if not date_of_service:
                 cases_without_dates += 1
                 logger.warning(f"No valid date for ASMG calculation for case {patient_ticket} - ASMG units set to 0.0")
             
@@ -231,45 +203,73 @@ class CaseGrouper:
                 logger.warning(f"Skipping case with invalid ticket number: {patient_ticket}")
                 continue
 
-            # Check if case already exists
-            existing_case = self.session.query(MasterCase).filter_by(
-                patient_ticket_number=patient_ticket
-            ).first()
-            
-            if existing_case:
-                # Update existing case with new summary data
-                existing_case.date_of_service = date_of_service
-                existing_case.cpt_code = cpt_codes_combined
-                existing_case.initial_start_time = initial_start_time
-                existing_case.total_anes_time = total_anes_time
-                existing_case.total_anes_base_units = total_anes_base_units
-                existing_case.total_med_base_units = total_med_base_units
-                existing_case.total_other_units = total_other_units
-                existing_case.asmg_units = asmg_units
-                existing_case.final_ticket_number = final_ticket
-                existing_case.updated_at = datetime.utcnow()
-                master_case = existing_case
-            else:
-                # Create new case
-                master_case = MasterCase(
-                    patient_ticket_number=patient_ticket,
-                    date_of_service=date_of_service,
-                    cpt_code=cpt_codes_combined,
-                    initial_start_time=initial_start_time,
-                    total_anes_time=total_anes_time,
-                    total_anes_base_units=total_anes_base_units,
-                    total_med_base_units=total_med_base_units,
-                    total_other_units=total_other_units,
-                    asmg_units=asmg_units,
-                    initial_ticket_number=initial_ticket,
-                    final_ticket_number=final_ticket
+            values = {
+                'date_of_service': date_of_service,
+                'cpt_code': ', '.join(sorted(cpt_codes.split(_CODE_SEPARATOR))) if cpt_codes else '',
+                'initial_start_time': initial_start_time,
+                'total_anes_time': total_anes_time,
+                'total_anes_base_units': total_anes_base_units,
+                'total_med_base_units': total_med_base_units,
+                'total_other_units': total_other_units,
+                'asmg_units': 0.0,  # filled in below for cases with a date
+                'final_ticket_number': final_ticket,
+                'patient_ticket_number': patient_ticket,
+                'initial_ticket_number': initial_ticket
+            }
+            if date_of_service:
+                dated_cases.append(values)
+            case_values.append(values)
+        
+        # Calculate ASMG units for every dated case in one vectorized pass
+        if dated_cases:
+            try:
+                asmg_units = calculator.calculate_asmg_units_batch(
+                    [values['date_of_service'] for values in dated_cases],
+                    [values['total_anes_base_units'] for values in dated_cases],
+                    [values['total_anes_time'] for values in dated_cases],
+                    [values['total_med_base_units'] for values in dated_cases]
                 )
-                self.session.add(master_case)
-                self.session.flush()  # Get the ID
-
-            # Link all transactions to the master case
-            for transaction in transactions:
-                transaction.master_case_id = master_case.id
+                for values, units in zip(dated_cases, asmg_units.tolist()):
+                    values['asmg_units'] = units
+            except Exception as e:
+                logger.warning(f"Error calculating ASMG units: {str(e)}")
+        
+        for start in range(0, len(case_values), self.batch_size):
+            # Upsert a batch of cases in one statement; re-runs update the
+            # existing case for a ticket instead of duplicating it
+            stmt = sqlite_insert(MasterCase).values(case_values[start:start + self.batch_size])
+            stmt = stmt.on_conflict_do_update(
+                index_elements=['patient_ticket_number'],
+                set_={
+                    **{column: stmt.excluded[column] for column in self._UPSERT_COLUMNS},
+                    'updated_at': func.now()
+                }
+            )
+            self.session.execute(stmt)
+        
+        case_for_ticket = (
+            select(func.min(MasterCase.id))
+            .where(MasterCase.patient_ticket_number == ChargeTransaction.phys_ticket_ref)
+            .scalar_subquery()
+        )
+        for chunk in ticket_chunks:
+            link = update(ChargeTransaction.__table__)
+            if chunk is not None:
+                # Drop cases whose tickets no longer have any transactions,
+                # e.g. after a report was replaced or deleted
+                self.session.execute(
+                    delete(MasterCase)
+                    .where(MasterCase.patient_ticket_number.in_(chunk))
+                    .where(~exists().where(ChargeTransaction.phys_ticket_ref == MasterCase.patient_ticket_number))
+                )
+                link = link.where(ChargeTransaction.phys_ticket_ref.in_(chunk))
+            
+            # Link the transactions to their master case in one set-based UPDATE
+            self.session.execute(
+                link
+                .where(case_for_ticket.isnot(None))
+                .values(master_case_id=case_for_ticket)
+            )
         
         self.session.commit()
         
@@ -282,16 +282,17 @@ class CaseGrouper:
             summary_msg = f"Case grouping completed: {total_cases} total cases, all cases have valid dates for ASMG calculation"
             logger.info(summary_msg)
             print(f"INFO: {summary_msg}")
+        
+        return total_cases
 
     def get_case_statistics(self):
         """
         Returns statistics about the cases.
         """
-        total_cases = self.session.query(MasterCase).count()
-        total_transactions = self.session.query(ChargeTransaction).count()
-        linked_transactions = self.session.query(ChargeTransaction).filter(
-            ChargeTransaction.master_case_id.isnot(None)
-        ).count()
+        total_transactions, linked_transactions = self.session.execute(
+            select(func.count(ChargeTransaction.id), func.count(ChargeTransaction.master_case_id))
+        ).one()
+        total_cases = self.session.scalar(select(func.count(MasterCase.id)))
         
         return {
             'total_cases': total_cases,
@@ -13,8 +13,13 @@ def check_database():
         for summary in summaries:
             print(f"  - ID: {summary.id}, File: {summary.source_file}")
         
+        # Transactions per summary in one grouped query
+        trans_counts = dict(session.query(
+            ChargeTransaction.summary_id, func.count(ChargeTransaction.id)
+        ).group_by(ChargeTransaction.summary_id).all())
+        
         # Check charge transactions
-        total_transactions = session.query(ChargeTransaction).count()
+        total_transactions = sum(trans_counts.values())
         print(f"Total Charge Transactions: {total_transactions}")
         
         # Check master cases
@@ -29,7 +34,7 @@ def check_database():
         
         # Check transactions by summary
         for summary in summaries:
-            trans_count = session.query(ChargeTransaction).filter_by(summary_id=summary.id).count()
+            trans_count = trans_counts.get(summary.id, 0)
             print(f"  Summary {summary.id}: {trans_count} transactions")
             
     except Exception as e:
@@ -2,8 +2,18 @@
 import pdfplumber
 import re
 
-def find_tickets_in_pdf(pdf_path, ticket_numbers):
-    """Find specific ticket numbers in the PDF and show their lines"""
+def find_tickets_in_pdf(pdf_path, ticket_numbers, verbose=False):
+    """Find specific ticket numbers in the PDF.
+    
+    Returns a list of (page_number, line_index, line) tuples, page numbers
+    1-based; with verbose=True each matching line is also printed with its
+    neighbours and character positions.
+    """
+    matches = []
+    if not ticket_numbers:
+        return matches
+    # One alternation for all tickets, so each line is scanned once
+    ticket_pattern = re.compile('|'.join(map(re.escape, ticket_numbers)))
     
     with pdfplumber.open(pdf_path) as pdf:
         for page_num in range(3, len(pdf.pages)):  # Start from page 4
@@ -17,26 +27,31 @@ def find_tickets_in_pdf(pdf_path, ticket_numbers):
             
             for i, line in enumerate(lines):
                 # Check if line contains any of our ticket numbers
-                for ticket in ticket_numbers:
-                    if ticket in line:
-                        print(f"\n=== Page {page_num + 1}, Line {i} ===")
-                        print(f"Line: {repr(line)}")
-                        print(f"Length: {len(line)}")
-                        
-                        # Show surrounding lines for context
-                        if i > 0:
-                            print(f"Previous: {repr(lines[i-1])}")
-                        if i < len(lines) - 1:
-                            print(f"Next: {repr(lines[i+1])}")
-                        
-                        # Show character positions
-                        print("\nCharacter positions:")
-                        for j in range(0, min(len(line), 150), 10):
-                            print(f"{j:3d}: '{line[j:j+10]}'")
+                if ticket_pattern.search(line):
+                    matches.append((page_num + 1, i, line))
+                    if not verbose:
+                        continue
+                    print(f"\n=== Page {page_num + 1}, Line {i} ===")
+                    print(f"Line: {repr(line)}")
+                    print(f"Length: {len(line)}")
+                    
+                    # Show surrounding lines for context
+                    if i > 0:
+                        print(f"Previous: {repr(lines[i-1])}")
+                    if i < len(lines) - 1:
+                        print(f"Next: {repr(lines[i+1])}")
+                    
+                    # Show character positions
+                    print("\nCharacter positions:")
+                    for j in range(0, min(len(line), 150), 10):
+                        print(f"{j:3d}: '{line[j:j+10]}'")
+    
+    return matches
 
 if __name__ == "__main__":
     pdf_path = "data/archive/20250613-614-Compensation_Reports_unlocked.pdf"
     tickets = ['61411951', '61411952', '61411953']
     
     print("Searching for problematic tickets in PDF...")
-    find_tickets_in_pdf(pdf_path, tickets)
\ No newline at end of file
+    matches = find_tickets_in_pdf(pdf_path, tickets, verbose=True)
+    print(f"\nFound {len(matches)} matching lines")
\ No newline at end of file
@@ -3,15 +3,16 @@ Data analysis module for medical compensation reports.
 Provides insights and visualizations based on the stored data.
 """
 
+import numpy as np
 import pandas as pd
-import matplotlib
-matplotlib.use('Agg')
-import matplotlib.pyplot as plt
-import seaborn as sns
-from sqlalchemy import text
+from sqlalchemy import func, text
 from datetime import datetime, timedelta
+from functools import wraps
+import hashlib
 import logging
-from database_models import engine, get_session, MasterCase
+import os
+import threading
+from database_models import engine, get_session, Session, MasterCase, MonthlySummary, ChargeTransaction
 from asmg_calculator import ASMGCalculator
 import sqlalchemy
 
@@ -19,59 +20,233 @@ import sqlalchemy
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-# Set style for plots
-plt.style.use('default')
-sns.set_palette("husl")
+# matplotlib and seaborn are only imported once something is plotted, so
+# callers that just read data don't pay for them
+_style_lock = threading.Lock()
+_style_ready = False
+
+def _ensure_style():
+    """Import the plotting libraries and set the plot style, once per process."""
+    global _style_ready
+    with _style_lock:
+        if _style_ready:
+            return
+        import matplotlib
+        matplotlib.use('Agg')
+        import matplotlib.style
+        import seaborn as sns
+        
+        # Set style for plots
+        matplotlib.style.use('default')
+        sns.set_palette("husl")
+        _style_ready = True
+
+# Charge transaction columns read as 0 instead of NULL
+_ZERO_FILLED_COLUMNS = frozenset(['anes_base_units', 'med_base_units', 'other_units', 'chg_amt'])
+# Select expression for each charge transaction column, built once from the schema
+_CT_SELECT = {
+    column.name: func.coalesce(column, 0.0).label(column.name) if column.name in _ZERO_FILLED_COLUMNS else column
+    for column in ChargeTransaction.__table__.columns
+}
+_MC_COLUMNS = frozenset(c.name for c in MasterCase.__table__.columns)
+# Rows fetched at a time when a whole table is read
+_BULK_READ_ROWS = 10000
+
+# Month abbreviations indexed by month number - 1
+_MONTH_NAMES = np.array(['Jan', 'Feb', 'Mar', 'Apr', 'May', 'Jun',
+                         'Jul', 'Aug', 'Sep', 'Oct', 'Nov', 'Dec'], dtype=object)
+
+# Memoized analyzer results: (method name, args) -> (database version, result).
+# Shared by every analyzer, since they all read the same database.
+_RESULT_CACHE = {}
+_RESULT_CACHE_LOCK = threading.Lock()
+_RESULT_CACHE_MAXSIZE = 256
+# Bumped by invalidate(), so results computed before it are not stored after it
+_cache_generation = 0
+_DB_PATH = engine.url.database or ''
+
+def _db_version():
+    """Modification time and size of the database and its WAL file.
+    
+    Every committed write changes one of them, whichever process made it;
+    reads change neither.
+    """
+    version = []
+    for path in (_DB_PATH, _DB_PATH + '-wal'):
+        try:
+            stat = os.stat(path)
+        except OSError:
+            version.append(None)
+        else:
+            version.append((stat.st_mtime_ns, stat.st_size))
+    return tuple(version)
+
+def _db_cache(method):
+    """Memoize an analyzer read until the database changes.
+    
+    Results are returned by reference; callers must not modify them.
+    """
+    name = method.__name__
+    
+    @wraps(method)
+    def wrapper(self, *args, **kwargs):
+        key = (name, args, tuple(sorted(kwargs.items())))
+        # Read before running the query, so a write that lands while it runs
+        # leaves the stored result already out of date
+        version = _db_version()
+        entry = _RESULT_CACHE.get(key)
+        if entry is not None and entry[0] == version:
+            return entry[1]
+        
+        generation = _cache_generation
+        result = method(self, *args, **kwargs)
+        with _RESULT_CACHE_LOCK:
+            if generation == _cache_generation:
+                if len(_RESULT_CACHE) >= _RESULT_CACHE_MAXSIZE:
+                    # Dicts keep insertion order, so this drops the oldest entry
+                    _RESULT_CACHE.pop(next(iter(_RESULT_CACHE)))
+                _RESULT_CACHE.pop(key, None)
+                _RESULT_CACHE[key] = (version, result)
+        return result
+    
+    return wrapper
+
+def _currency_tick(x, pos):
+    """Tick label for a dollar axis."""
+    return f'${x:,.0f}'
+
+# Resolution of saved plots; they are only shown on the dashboard
+_PLOT_DPI = 150
+
+def _save_figure(fig, save_path):
+    """Lay out a finished plot and write it to save_path."""
+    # Layout is done once here; bbox_inches='tight' would render a second time
+    fig.tight_layout()
+    fig.savefig(save_path, dpi=_PLOT_DPI)
+
+def _linear_fit(x, y):
+    """
+    Least-squares line and Pearson correlation from one set of sums.
+    
+    Returns:
+        tuple: (slope, intercept, r); r is NaN when either series is constant
+    """
+    dx = x - x.mean()
+    dy = y - y.mean()
+    sxx = dx @ dx
+    syy = dy @ dy
+    sxy = dx @ dy
+    slope = sxy / sxx if sxx else 0.0
+    intercept = y.mean() - slope * x.mean()
+    r = sxy / np.sqrt(sxx * syy) if sxx and syy else float('nan')
+    return slope, intercept, r
 
 class CompensationAnalyzer:
     """Class for analyzing compensation and practice data."""
     
     def __init__(self):
         self.engine = engine
-        self.session = get_session()
+        # Thread-local session: one analyzer is shared by all request threads
+        self.session = Session
+        # One reusable Figure per thread, since plots may render concurrently
+        self._figures = threading.local()
     
-    def __del__(self):
-        """Close session when object is destroyed."""
-        if hasattr(self, 'session') and self.session:
-            self.session.close()
+    def _figure(self, figsize):
+        """Return this thread's Figure, cleared and resized for a new plot."""
+        fig = getattr(self._figures, 'figure', None)
+        if fig is None:
+            _ensure_style()
+            from matplotlib.figure import Figure
+            fig = self._figures.figure = Figure()
+        else:
+            fig.clear()
+        fig.set_size_inches(*figsize)
+        return fig
     
+    def _read_sql(self, sql, params=None, parse_dates=None, chunksize=None) -> pd.DataFrame:
+        """
+        Run a SQL string on the raw sqlite3 connection of a pooled connection.
+        
+        pandas and SQLAlchemy add no per-query setup or per-cell result
+        processing this way, and sqlite3 keeps each connection's prepared
+        statements keyed by SQL text, so a fixed query with bound params is
+        only compiled once per connection. The columns in parse_dates are
+        converted in one vectorized pass.
+        
+        With chunksize, rows are fetched that many at a time, so whole-table
+        reads never hold every row as Python tuples next to the frame.
+        """
+        with self.engine.connect() as conn:
+            raw = conn.connection.driver_connection
+            if chunksize is None:
+                return pd.read_sql(sql, raw, params=params, parse_dates=parse_dates)
+            chunks = list(pd.read_sql(sql, raw, params=params, parse_dates=parse_dates,
+                                      chunksize=chunksize))
+        if len(chunks) > 1:
+            # A chunk where a column is all NULL reads it as object; infer the
+            # dtypes again so the frame matches a single read
+            return pd.concat(chunks, ignore_index=True).infer_objects()
+        if chunks[0].empty:
+            # pandas skips parse_dates on an empty chunk; a plain read doesn't
+            return self._read_sql(sql, params, parse_dates)
+        return chunks[0]
+    
+    def _read_frame(self, statement, parse_dates=None, chunksize=None) -> pd.DataFrame:
+        """Run a SQLAlchemy statement through _read_sql, with its values inlined."""
+        sql = str(statement.compile(self.engine, compile_kwargs={'literal_binds': True}))
+        return self._read_sql(sql, parse_dates=parse_dates, chunksize=chunksize)
+    
+    @classmethod
+    def invalidate(cls):
+        """Drop every memoized result, e.g. after an upload or a deletion."""
+        global _cache_generation
+        with _RESULT_CACHE_LOCK:
+            _cache_generation += 1
+            _RESULT_CACHE.clear()
+    
+    def close(self):
+        """Release this thread's session; the analyzer can still be used afterwards."""
+        self.session.remove()
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+    
+    @_db_cache
     def get_summary_statistics(self) -> dict:
         """Get basic summary statistics for the dashboard."""
         try:
             stats = {}
             
-            # Total reports processed
-            query = "SELECT COUNT(*) as total_reports FROM monthly_summary"
-            result = pd.read_sql(query, self.engine)
-            stats['total_reports'] = result['total_reports'].iloc[0] if not result.empty else 0
-            
-            # Total transactions
-            try:
-                query = "SELECT COUNT(*) as total_transactions FROM charge_transactions"
-                result = pd.read_sql(query, self.engine)
-                stats['total_transactions'] = result['total_transactions'].iloc[0] if not result.empty else 0
-            except:
-                stats['total_transactions'] = 0
-            
-            # Latest gross pay
-            query = """
-            SELECT gross_pay, pay_period_end_date
-            FROM monthly_summary
-            ORDER BY pay_period_end_date DESC
-            LIMIT 1
-            """
-            result = pd.read_sql(query, self.engine)
-            if not result.empty:
-                stats['latest_gross_pay'] = result['gross_pay'].iloc[0] or 0
-                stats['latest_period'] = result['pay_period_end_date'].iloc[0]
-            else:
-                stats['latest_gross_pay'] = 0
-                stats['latest_period'] = None
+            # Report and transaction counts plus the latest period's pay,
+            # read in one round-trip
+            query = text("""
+            SELECT
+                (SELECT COUNT(*) FROM monthly_summary),
+                (SELECT COUNT(*) FROM charge_transactions),
+                latest.gross_pay,
+                latest.pay_period_end_date
+            FROM (SELECT 1)
+            LEFT JOIN (
+                SELECT gross_pay, pay_period_end_date
+                FROM monthly_summary
+                ORDER BY pay_period_end_date DESC
+                LIMIT 1
+            ) AS latest
+            """)
+            with self.engine.connect() as conn:
+                total_reports, total_transactions, gross_pay, latest_period = conn.execute(query).one()
+            stats['total_reports'] = total_reports
+            stats['total_transactions'] = total_transactions
+            stats['latest_gross_pay'] = gross_pay or 0
+            stats['latest_period'] = latest_period
             
             # Total billed amount
             try:
                 query = "SELECT SUM(billed_amount) as total_billed FROM charge_transactions"
-                result = pd.read_sql(query, self.engine)
+                result = self._read_sql(query)
                 stats['total_billed'] = result['total_billed'].iloc[0] if not result.empty and result['total_billed'].iloc[0] else 0
             except:
                 stats['total_billed'] = 0
@@ -88,6 +263,7 @@ class CompensationAnalyzer:
                 'total_billed': 0
             }
     
+    @_db_cache
     def get_monthly_income_trend(self, months=36) -> pd.DataFrame:
         """
         Get monthly income trend over specified number of months.
@@ -101,143 +277,257 @@ class CompensationAnalyzer:
         query = """
         SELECT 
             pay_period_end_date,
-            gross_pay,
-            total_commission,
-            base_salary,
-            bonus_amount
+            COALESCE(gross_pay, 0.0) as gross_pay,
+            COALESCE(total_commission, 0.0) as total_commission,
+            COALESCE(base_salary, 0.0) as base_salary,
+            COALESCE(bonus_amount, 0.0) as bonus_amount
         FROM monthly_summary 
-        WHERE pay_period_end_date >= date('now', '-{} months')
+        WHERE pay_period_end_date >= date('now', :offset)
         ORDER BY pay_period_end_date
-        """.format(months)
-        
-        df = pd.read_sql_query(query, self.engine)
-        numeric_cols = ['gross_pay', 'total_commission', 'base_salary', 'bonus_amount']
-        df[numeric_cols] = df[numeric_cols].fillna(0)
-        df['pay_period_end_date'] = pd.to_datetime(df['pay_period_end_date'])
+        """
+        # The month count is bound, so the statement text never changes
+        df = self._read_sql(query, {'offset': f'-{int(months)} months'},
+                            parse_dates=['pay_period_end_date'])
         
         return df
     
-    def get_procedure_profitability(self) -> pd.DataFrame:
+    @_db_cache
+    def get_transaction_aggregates(self) -> pd.DataFrame:
         """
-        Analyze profitability by CPT code.
+        Time and unit totals per (CPT code, carrier) pair.
+        
+        The procedure and payer analyses both roll up from this, so the
+        charge transactions are scanned once for the two of them.
         
         Returns:
-            DataFrame: CPT code analysis
+            DataFrame: Row count and, per time/unit column, its non-null count and sum
         """
         query = """
         SELECT 
             cpt_code,
-            COUNT(*) as frequency,
-            AVG(CAST(anes_time_min AS REAL)) as avg_time,
-            AVG(CAST(anes_base_units AS REAL)) as avg_anes_units,
-            AVG(CAST(med_base_units AS REAL)) as avg_med_units,
-            SUM(CAST(anes_time_min AS REAL)) as total_time,
-            SUM(CAST(anes_base_units AS REAL)) as total_anes_units,
-            SUM(CAST(med_base_units AS REAL)) as total_med_units
+            pay_code,
+            COUNT(*) as row_count,
+            COUNT(anes_time_min) as time_count,
+            COALESCE(SUM(anes_time_min), 0.0) as total_time,
+            COUNT(anes_base_units) as anes_units_count,
+            COALESCE(SUM(anes_base_units), 0.0) as total_anes_units,
+            COUNT(med_base_units) as med_units_count,
+            COALESCE(SUM(med_base_units), 0.0) as total_med_units
         FROM charge_transactions 
-        WHERE cpt_code IS NOT NULL AND cpt_code != ''
-        GROUP BY cpt_code
-        HAVING frequency >= 2  -- Only include codes with at least 2 occurrences
-        ORDER BY frequency DESC
+        GROUP BY cpt_code, pay_code
         """
         
-        df = pd.read_sql_query(query, self.engine)
-        numeric_cols = ['frequency', 'avg_time', 'avg_anes_units', 'avg_med_units', 'total_time', 'total_anes_units', 'total_med_units']
-        df[numeric_cols] = df[numeric_cols].fillna(0)
-        return df
+        return self._read_sql(query)
     
-    def get_payer_performance(self) -> pd.DataFrame:
+    def _rollup_transactions(self, key, count_name, min_count) -> pd.DataFrame:
+        """Roll the (CPT code, carrier) totals up to one row per key with at least min_count rows."""
+        aggregates = self.get_transaction_aggregates()
+        aggregates = aggregates[aggregates[key].notna() & (aggregates[key] != '')]
+        totals = aggregates.drop(columns=['cpt_code', 'pay_code']).groupby(aggregates[key], sort=False).sum()
+        totals = totals[totals['row_count'] >= min_count]
+        
+        df = pd.DataFrame({count_name: totals['row_count']})
+        # AVG over the non-null values, 0 where there are none
+        for total, count, average in (('total_time', 'time_count', 'avg_time'),
+                                      ('total_anes_units', 'anes_units_count', 'avg_anes_units'),
+                                      ('total_med_units', 'med_units_count', 'avg_med_units')):
+            df[average] = (totals[total] / totals[count].where(totals[count] > 0)).fillna(0.0)
+        for total in ('total_time', 'total_anes_units', 'total_med_units'):
+            df[total] = totals[total]
+        return df.rename_axis(None)
+    
+    @_db_cache
+    def get_procedure_profitability(self, limit=None) -> pd.DataFrame:
         """
-        Analyze performance by insurance carrier.
+        Analyze profitability by CPT code.
+        
+        Args:
+            limit: Only return the first N rows (None for all)
         
         Returns:
-            DataFrame: Insurance carrier analysis
+            DataFrame: CPT code analysis
         """
-        query = """
-        SELECT 
-            pay_code as insurance_carrier,
-            COUNT(*) as claim_count,
-            AVG(CAST(anes_time_min AS REAL)) as avg_time,
-            AVG(CAST(anes_base_units AS REAL)) as avg_anes_units,
-            AVG(CAST(med_base_units AS REAL)) as avg_med_units,
-            SUM(CAST(anes_time_min AS REAL)) as total_time,
-            SUM(CAST(anes_base_units AS REAL)) as total_anes_units,
-            SUM(CAST(med_base_units AS REAL)) as total_med_units
-        FROM charge_transactions 
-        WHERE pay_code IS NOT NULL AND pay_code != ''
-        GROUP BY pay_code
-        HAVING claim_count >= 5  -- Only include carriers with at least 5 claims
-        ORDER BY total_anes_units DESC
+        # Only include codes with at least 2 occurrences
+        df = self._rollup_transactions('cpt_code', 'frequency', 2)
+        df.insert(0, 'cpt_code', df.index)
+        df = df.sort_values(['frequency', 'cpt_code'], ascending=[False, True], kind='stable')
+        if limit is not None:
+            df = df.head(limit)
+        return df.reset_index(drop=True)
+    
+    @_db_cache
+    def get_payer_performance(self, limit=None) -> pd.DataFrame:
         """
+        Analyze performance by insurance carrier.
         
-        df = pd.read_sql_query(query, self.engine)
-        numeric_cols = ['claim_count', 'avg_time', 'avg_anes_units', 'avg_med_units', 'total_time', 'total_anes_units', 'total_med_units']
-        df[numeric_cols] = df[numeric_cols].fillna(0)
-        return df
+        Args:
+            limit: Only return the first N rows (None for all)
+        
+        Returns:
+            DataFrame: Insurance carrier analysis
+        """
+        # Only include carriers with at least 5 claims
+        df = self._rollup_transactions('pay_code', 'claim_count', 5)
+        df.insert(0, 'insurance_carrier', df.index)
+        df = df.sort_values(['total_anes_units', 'insurance_carrier'], ascending=[False, True], kind='stable')
+        if limit is not None:
+            df = df.head(limit)
+        return df.reset_index(drop=True)
 
-    def get_charge_transactions(self, sort_by='phys_ticket_ref', sort_order='asc') -> pd.DataFrame:
+    @_db_cache
+    def get_charge_transactions(self, columns=None, sort_by='phys_ticket_ref', sort_order='asc',
+                                page=None, per_page=500) -> pd.DataFrame:
         """
-        Fetch all charge transactions with sorting.
+        Fetch charge transactions with sorting.
 
         Args:
+            columns (tuple): Names of the columns to read; None reads all of them.
             sort_by (str): Column to sort by.
             sort_order (str): 'asc' or 'desc'.
+            page (int): Zero-based page to fetch; None fetches every row.
+            per_page (int): Rows per page when paginating.
 
         Returns:
-            DataFrame: All charge transactions.
+            DataFrame: Charge transactions for the requested page.
         """
         try:
             # Validate sort_by to prevent SQL injection
-            from database_models import ChargeTransaction
-            allowed_columns = [c.name for c in ChargeTransaction.__table__.columns]
-            if sort_by not in allowed_columns:
+            if sort_by not in _CT_SELECT:
                 sort_by = 'phys_ticket_ref'
 
             # Validate sort_order
             if sort_order.lower() not in ['asc', 'desc']:
                 sort_order = 'asc'
 
-            # Use SQLAlchemy's order_by for safe query construction
-            query = self.session.query(ChargeTransaction)
+            # Use SQLAlchemy's order_by for safe query construction; missing
+            # unit and amount values come back as 0 straight from SQL
+            if columns is None:
+                selected = list(_CT_SELECT.values())
+            else:
+                selected = [_CT_SELECT[name] for name in columns if name in _CT_SELECT]
+            query = sqlalchemy.select(*selected)
             sort_column = getattr(ChargeTransaction, sort_by)
             if sort_order.lower() == 'desc':
                 query = query.order_by(sort_column.desc())
             else:
                 query = query.order_by(sort_column.asc())
 
-            df = pd.read_sql(query.statement, self.engine)
-            
-            if not df.empty:
-                possible_numeric_cols = ['billed_amount', 'paid_amount', 'time_min', 'anes_base_units', 'med_base_units', 'other_units', 'chg_amt']
-                existing_numeric_cols = [col for col in possible_numeric_cols if col in df.columns]
-                
-                if existing_numeric_cols:
-                    df[existing_numeric_cols] = df[existing_numeric_cols].fillna(0)
-            
+            if page is not None:
+                query = query.limit(per_page).offset(page * per_page)
+
+            names = {column.name for column in selected}
+            df = self._read_frame(query,
+                                  parse_dates=['created_at'] if 'created_at' in names else None,
+                                  chunksize=_BULK_READ_ROWS if page is None else None)
+            # Dates stay as their ISO strings, which render and serialize like
+            # the date objects the ORM would build; missing ones as None
+            for column in ('date_of_service', 'date_of_post'):
+                if column in df.columns:
+                    df[column] = df[column].astype(object).where(df[column].notna(), None)
             return df
         except Exception as e:
             logger.error(f"Error getting charge transactions: {str(e)}")
             return pd.DataFrame()
 
-    def get_master_cases(self, sort_by='date_of_service', sort_order='desc') -> pd.DataFrame:
+    @_db_cache
+    def get_charge_transaction_count(self) -> int:
+        """Total number of charge transactions, for paging through them."""
+        try:
+            with self.engine.connect() as conn:
+                return conn.execute(
+                    sqlalchemy.select(func.count()).select_from(ChargeTransaction)
+                ).scalar_one()
+        except Exception as e:
+            logger.error(f"Error counting charge transactions: {str(e)}")
+            return 0
+
+    @_db_cache
+    def get_charge_transaction_totals(self) -> dict:
         """
-        Retrieves all master cases from the database with sorting.
+        Figures over every charge transaction for the tickets page summary cards.
+        
+        Returns:
+            dict: unique_cpt_codes, total_billed (sum of chg_amt) and
+                avg_transaction (total_billed per transaction)
+        """
+        try:
+            with self.engine.connect() as conn:
+                unique_cpt_codes, total_billed, count = conn.execute(
+                    sqlalchemy.select(
+                        func.count(ChargeTransaction.cpt_code.distinct()),
+                        func.coalesce(func.sum(ChargeTransaction.chg_amt), 0.0),
+                        func.count()
+                    )
+                ).one()
+            return {
+                'unique_cpt_codes': unique_cpt_codes,
+                'total_billed': total_billed,
+                'avg_transaction': total_billed / count if count else 0
+            }
+        except Exception as e:
+            logger.error(f"Error getting charge transaction totals: {str(e)}")
+            return {'unique_cpt_codes': 0, 'total_billed': 0, 'avg_transaction': 0}
+
+    def get_data_fingerprint(self) -> str:
+        """
+        Cheap fingerprint of the report data the charts are drawn from.
+        
+        Row count, highest id and latest created_at of the monthly summaries
+        and charge transactions: imports and deletes both change it, including
+        deletes made outside the web app.
+        
+        Returns:
+            str: Hex digest, or an empty string if the tables can't be read.
+        """
+        try:
+            with self.engine.connect() as conn:
+                state = [
+                    conn.execute(sqlalchemy.select(
+                        sqlalchemy.func.count(model.id),
+                        sqlalchemy.func.max(model.id),
+                        sqlalchemy.func.max(model.created_at)
+                    )).one()
+                    for model in (MonthlySummary, ChargeTransaction)
+                ]
+            return hashlib.blake2s(repr(state).encode()).hexdigest()
+        except Exception as e:
+            logger.error(f"Error getting data fingerprint: {str(e)}")
+            return ''
+
+    @_db_cache
+    def get_master_case_count(self) -> int:
+        """Total number of master cases, for paging through them."""
+        try:
+            with self.engine.connect() as conn:
+                return conn.execute(
+                    sqlalchemy.select(func.count()).select_from(MasterCase)
+                ).scalar_one()
+        except Exception as e:
+            logger.error(f"Error counting master cases: {str(e)}")
+            return 0
+
+    @_db_cache
+    def get_master_cases(self, sort_by='date_of_service', sort_order='desc',
+                         page=None, per_page=500) -> pd.DataFrame:
+        """
+        Retrieves master cases from the database with sorting.
         
         Args:
             sort_by (str): Field to sort by (default: date_of_service)
             sort_order (str): Sort order ('asc' or 'desc', default: 'desc')
+            page (int): Zero-based page to fetch; None fetches every case
+            per_page (int): Cases per page when paginating (default: 500)
             
         Returns:
             DataFrame: Master cases data with stored ASMG units
         """
         try:
-            from database_models import MasterCase
-            
-            # Build query with sorting
-            query = self.session.query(MasterCase)
+            # Build a Core select with sorting; the rows go straight into the
+            # frame, so no session or ORM query is needed
+            query = sqlalchemy.select(MasterCase)
             
             # Add sorting - now asmg_units is a database column so it can be sorted at DB level
-            if hasattr(MasterCase, sort_by):
+            if sort_by in _MC_COLUMNS:
                 sort_column = getattr(MasterCase, sort_by)
                 if sort_order.lower() == 'desc':
                     query = query.order_by(sort_column.desc())
@@ -247,12 +537,13 @@ class CompensationAnalyzer:
                 # Default sorting by date descending
                 query = query.order_by(MasterCase.date_of_service.desc())
             
-            # Convert to DataFrame
-            df = pd.read_sql(query.statement, self.session.bind)
+            if page is not None:
+                query = query.limit(per_page).offset(page * per_page)
             
-            # Convert date columns
-            if 'date_of_service' in df.columns:
-                df['date_of_service'] = pd.to_datetime(df['date_of_service'])
+            # Convert to DataFrame, parsing the date columns as it is built
+            df = self._read_frame(query,
+                                  parse_dates=['date_of_service', 'created_at', 'updated_at'],
+                                  chunksize=_BULK_READ_ROWS if page is None else None)
             
             return df
             
@@ -260,6 +551,7 @@ class CompensationAnalyzer:
             logger.error(f"Error getting master cases: {str(e)}")
             return pd.DataFrame()
     
+    @_db_cache
     def get_seasonal_trends(self) -> pd.DataFrame:
         """
         Analyze seasonal trends in income and case volume.
@@ -270,26 +562,22 @@ class CompensationAnalyzer:
         query = """
         SELECT 
             CAST(strftime('%m', pay_period_end_date) AS INTEGER) as month,
-            AVG(gross_pay) as avg_monthly_income,
-            AVG(total_commission) as avg_commission,
+            COALESCE(AVG(gross_pay), 0.0) as avg_monthly_income,
+            COALESCE(AVG(total_commission), 0.0) as avg_commission,
             COUNT(*) as report_count
         FROM monthly_summary
         GROUP BY month
         ORDER BY month
         """
         
-        df = pd.read_sql_query(query, self.engine)
+        df = self._read_sql(query)
         
-        numeric_cols = ['avg_monthly_income', 'avg_commission', 'report_count']
-        df[numeric_cols] = df[numeric_cols].fillna(0)
-
-        # Add month names
-        month_names = ['Jan', 'Feb', 'Mar', 'Apr', 'May', 'Jun',
-                      'Jul', 'Aug', 'Sep', 'Oct', 'Nov', 'Dec']
-        df['month_name'] = df['month'].apply(lambda x: month_names[x-1])
+        # Add month names (one array lookup for the whole column)
+        df['month_name'] = _MONTH_NAMES[df['month'].to_numpy(dtype=np.intp) - 1]
         
         return df
     
+    @_db_cache
     def get_commission_correlation(self) -> pd.DataFrame:
         """
         Analyze correlation between billed amounts and commission.
@@ -299,8 +587,8 @@ class CompensationAnalyzer:
         """
         query = """
         SELECT 
-            s.total_commission,
-            s.gross_pay,
+            COALESCE(s.total_commission, 0.0) as total_commission,
+            COALESCE(s.gross_pay, 0.0) as gross_pay,
             s.pay_period_end_date,
             COALESCE(SUM(t.billed_amount), 0) as total_billed,
             COALESCE(SUM(t.paid_amount), 0) as total_paid,
@@ -311,26 +599,22 @@ class CompensationAnalyzer:
         ORDER BY s.pay_period_end_date
         """
         
-        df = pd.read_sql_query(query, self.engine)
-        numeric_cols = ['total_commission', 'gross_pay', 'total_billed', 'total_paid', 'transaction_count']
-        df[numeric_cols] = df[numeric_cols].fillna(0)
-        df['pay_period_end_date'] = pd.to_datetime(df['pay_period_end_date'])
+        df = self._read_sql(query, parse_dates=['pay_period_end_date'])
         
         return df
     
-    def plot_income_trend(self, save_path=None):
+    def plot_income_trend(self, save_path=None, df=None):
         """Plot monthly income trend."""
-        df = self.get_monthly_income_trend()
-        
-        # ADD THIS FIX:
-        numeric_cols = ['gross_pay', 'total_commission', 'base_salary', 'bonus_amount']
-        df[numeric_cols] = df[numeric_cols].fillna(0)
+        # df: a get_monthly_income_trend result the caller already has
+        if df is None:
+            df = self.get_monthly_income_trend()
         
         if df.empty:
             logger.warning("No data available for income trend analysis")
             return
         
-        fig, ax = plt.subplots(figsize=(12, 6))
+        fig = self._figure((12, 6))
+        ax = fig.subplots()
         
         ax.plot(df['pay_period_end_date'], df['gross_pay'], 
                marker='o', linewidth=2, label='Gross Pay')
@@ -344,32 +628,27 @@ class CompensationAnalyzer:
         ax.grid(True, alpha=0.3)
         
         # Format y-axis as currency
-        ax.yaxis.set_major_formatter(plt.FuncFormatter(lambda x, p: f'${x:,.0f}'))
-        
-        plt.xticks(rotation=45)
-        plt.tight_layout()
+        ax.yaxis.set_major_formatter(_currency_tick)
         
+        ax.tick_params(axis='x', labelrotation=45)
         if save_path:
-            plt.savefig(save_path, dpi=300, bbox_inches='tight')
+            _save_figure(fig, save_path)
             logger.info(f"Income trend plot saved to: {save_path}")
-        
-        plt.close(fig)
     
-    def plot_procedure_profitability(self, top_n=15, save_path=None):
+    def plot_procedure_profitability(self, top_n=15, save_path=None, df=None):
         """Plot top procedures by frequency and profitability."""
-        df = self.get_procedure_profitability()
+        if df is None:
+            # Top N procedures by frequency, selected in SQL
+            top_procedures = self.get_procedure_profitability(limit=top_n)
+        else:
+            top_procedures = df.head(top_n)
         
-        numeric_cols = ['frequency', 'avg_time', 'avg_anes_units', 'avg_med_units', 'total_time', 'total_anes_units', 'total_med_units']
-        df[numeric_cols] = df[numeric_cols].fillna(0)
-        
-        if df.empty:
+        if top_procedures.empty:
             logger.warning("No data available for procedure profitability analysis")
             return
         
-        # Get top N procedures by frequency
-        top_procedures = df.head(top_n)
-        
-        fig, (ax1, ax2) = plt.subplots(2, 1, figsize=(12, 10))
+        fig = self._figure((12, 10))
+        ax1, ax2 = fig.subplots(2, 1)
         
         # Plot 1: Frequency
         bars1 = ax1.bar(range(len(top_procedures)), top_procedures['frequency'])
@@ -380,10 +659,7 @@ class CompensationAnalyzer:
         ax1.set_xticklabels(top_procedures['cpt_code'], rotation=45)
         
         # Add value labels on bars
-        for i, bar in enumerate(bars1):
-            height = bar.get_height()
-            ax1.text(bar.get_x() + bar.get_width()/2., height,
-                    f'{int(height)}', ha='center', va='bottom')
+        ax1.bar_label(bars1, fmt='{:.0f}')
         
         # Plot 2: Average time
         bars2 = ax2.bar(range(len(top_procedures)), top_procedures['avg_time'])
@@ -394,33 +670,25 @@ class CompensationAnalyzer:
         ax2.set_xticklabels(top_procedures['cpt_code'], rotation=45)
         
         # Add value labels on bars
-        for i, bar in enumerate(bars2):
-            height = bar.get_height()
-            ax2.text(bar.get_x() + bar.get_width()/2., height,
-                    f'{height:.1f}', ha='center', va='bottom')
-        
-        plt.tight_layout()
+        ax2.bar_label(bars2, fmt='{:.1f}')
         
         if save_path:
-            plt.savefig(save_path, dpi=300, bbox_inches='tight')
+            _save_figure(fig, save_path)
             logger.info(f"Procedure profitability plot saved to: {save_path}")
-        
-        plt.close(fig)
     
-    def plot_payer_performance(self, top_n=10, save_path=None):
+    def plot_payer_performance(self, top_n=10, save_path=None, df=None):
         """Plot top insurance carriers by total payments."""
-        df = self.get_payer_performance()
-        
-        numeric_cols = ['claim_count', 'avg_time', 'avg_anes_units', 'avg_med_units', 'total_time', 'total_anes_units', 'total_med_units']
-        df[numeric_cols] = df[numeric_cols].fillna(0)
+        if df is None:
+            top_payers = self.get_payer_performance(limit=top_n)
+        else:
+            top_payers = df.head(top_n)
         
-        if df.empty:
+        if top_payers.empty:
             logger.warning("No data available for payer performance analysis")
             return
         
-        top_payers = df.head(top_n)
-        
-        fig, ax = plt.subplots(figsize=(12, 8))
+        fig = self._figure((12, 8))
+        ax = fig.subplots()
         
         bars = ax.barh(range(len(top_payers)), top_payers['total_time'])
         ax.set_title(f'Top {top_n} Insurance Carriers by Total Time', 
@@ -431,31 +699,23 @@ class CompensationAnalyzer:
         ax.set_yticklabels(top_payers['insurance_carrier'])
         
         # Add value labels on bars
-        for i, bar in enumerate(bars):
-            width = bar.get_width()
-            ax.text(width, bar.get_y() + bar.get_height()/2.,
-                   f'{width:.1f}', ha='left', va='center')
-        
-        plt.tight_layout()
+        ax.bar_label(bars, fmt='{:.1f}')
         
         if save_path:
-            plt.savefig(save_path, dpi=300, bbox_inches='tight')
+            _save_figure(fig, save_path)
             logger.info(f"Payer performance plot saved to: {save_path}")
-        
-        plt.close(fig)
     
-    def plot_seasonal_trends(self, save_path=None):
+    def plot_seasonal_trends(self, save_path=None, df=None):
         """Plot seasonal trends in income."""
-        df = self.get_seasonal_trends()
-        
-        numeric_cols = ['avg_monthly_income', 'avg_commission', 'report_count']
-        df[numeric_cols] = df[numeric_cols].fillna(0)
+        if df is None:
+            df = self.get_seasonal_trends()
         
         if df.empty:
             logger.warning("No data available for seasonal trends analysis")
             return
         
-        fig, ax = plt.subplots(figsize=(10, 6))
+        fig = self._figure((10, 6))
+        ax = fig.subplots()
         
         ax.plot(df['month_name'], df['avg_monthly_income'], 
                marker='o', linewidth=3, markersize=8)
@@ -464,49 +724,46 @@ class CompensationAnalyzer:
         ax.set_xlabel('Month', fontsize=12)
         ax.set_ylabel('Average Monthly Income ($)', fontsize=12)
         ax.grid(True, alpha=0.3)
-        ax.yaxis.set_major_formatter(plt.FuncFormatter(lambda x, p: f'${x:,.0f}'))
-        
-        plt.xticks(rotation=45)
-        plt.tight_layout()
+        ax.yaxis.set_major_formatter(_currency_tick)
         
+        ax.tick_params(axis='x', labelrotation=45)
         if save_path:
-            plt.savefig(save_path, dpi=300, bbox_inches='tight')
+            _save_figure(fig, save_path)
             logger.info(f"Seasonal trends plot saved to: {save_path}")
-        
-        plt.close(fig)
     
-    def plot_commission_correlation(self, save_path=None):
+    def plot_commission_correlation(self, save_path=None, df=None):
         """Plot correlation between billed amounts and commission."""
-        df = self.get_commission_correlation()
-        
-        numeric_cols = ['total_commission', 'gross_pay', 'total_billed', 'total_paid', 'transaction_count']
-        df[numeric_cols] = df[numeric_cols].fillna(0)
+        if df is None:
+            df = self.get_commission_correlation()
         
         if df.empty:
             logger.warning("No data available for commission correlation analysis")
             return
         
+        # Work on plain float arrays from here on: the scatter, the fit and
+        # the trend line all take them without converting again
+        billed = df['total_billed'].to_numpy(dtype=float)
+        commission = df['total_commission'].to_numpy(dtype=float)
+        
         # Remove rows with zero values for better correlation
-        df_clean = df[(df['total_billed'] > 0) & (df['total_commission'] > 0)]
+        positive = (billed > 0) & (commission > 0)
+        billed, commission = billed[positive], commission[positive]
         
-        if df_clean.empty:
+        if not billed.size:
             logger.warning("No valid data for commission correlation analysis")
             return
         
-        fig, ax = plt.subplots(figsize=(10, 6))
+        fig = self._figure((10, 6))
+        ax = fig.subplots()
         
-        scatter = ax.scatter(df_clean['total_billed'], df_clean['total_commission'], 
-                           alpha=0.6, s=60)
+        scatter = ax.scatter(billed, commission, 
+                           alpha=0.6, s=60, rasterized=True)
         
-        # Add trend line
-        z = np.polyfit(df_clean['total_billed'], df_clean['total_commission'], 1)
-        p = np.poly1d(z)
-        ax.plot(df_clean['total_billed'], p(df_clean['total_billed']), 
+        # Add trend line; the fit also gives the correlation
+        slope, intercept, correlation = _linear_fit(billed, commission)
+        ax.plot(billed, slope * billed + intercept, 
                "r--", alpha=0.8, linewidth=2)
         
-        # Calculate correlation
-        correlation = df_clean['total_billed'].corr(df_clean['total_commission'])
-        
         ax.set_title(f'Commission vs Total Billed (Correlation: {correlation:.3f})', 
                     fontsize=14, fontweight='bold')
         ax.set_xlabel('Total Billed Amount ($)', fontsize=12)
@@ -514,19 +771,15 @@ class CompensationAnalyzer:
         ax.grid(True, alpha=0.3)
         
         # Format axes as currency
-        ax.xaxis.set_major_formatter(plt.FuncFormatter(lambda x, p: f'${x:,.0f}'))
-        ax.yaxis.set_major_formatter(plt.FuncFormatter(lambda x, p: f'${x:,.0f}'))
-        
-        plt.tight_layout()
+        ax.xaxis.set_major_formatter(_currency_tick)
+        ax.yaxis.set_major_formatter(_currency_tick)
         
         if save_path:
-            plt.savefig(save_path, dpi=300, bbox_inches='tight')
+            _save_figure(fig, save_path)
             logger.info(f"Commission correlation plot saved to: {save_path}")
-        
-        plt.close(fig)
     
-    def generate_summary_report(self):
-        """Generate a comprehensive summary report."""
+    def generate_summary_report(self, income_df=None, procedure_df=None, payer_df=None):
+        """Generate a comprehensive summary report, reusing any frames already fetched."""
         print("=" * 60)
         print("MEDICAL PRACTICE COMPENSATION ANALYSIS REPORT")
         print("=" * 60)
@@ -534,7 +787,8 @@ class CompensationAnalyzer:
         print()
         
         # Basic statistics
-        income_df = self.get_monthly_income_trend()
+        if income_df is None:
+            income_df = self.get_monthly_income_trend()
         if not income_df.empty:
             print("INCOME SUMMARY:")
             print(f"  Total months analyzed: {len(income_df)}")
@@ -545,7 +799,8 @@ class CompensationAnalyzer:
             print()
         
         # Procedure analysis
-        procedure_df = self.get_procedure_profitability()
+        if procedure_df is None:
+            procedure_df = self.get_procedure_profitability()
         if not procedure_df.empty:
             print("PROCEDURE ANALYSIS:")
             print(f"  Total unique CPT codes: {len(procedure_df)}")
@@ -554,7 +809,8 @@ class CompensationAnalyzer:
             print()
         
         # Payer analysis
-        payer_df = self.get_payer_performance()
+        if payer_df is None:
+            payer_df = self.get_payer_performance()
         if not payer_df.empty:
             print("PAYER ANALYSIS:")
             print(f"  Total insurance carriers: {len(payer_df)}")
@@ -566,37 +822,59 @@ class CompensationAnalyzer:
         """Return a sorted list of all years present in MasterCase.date_of_service."""
         session = get_session()
         try:
-            years = session.query(sqlalchemy.extract('year', MasterCase.date_of_service)).distinct().all()
-            years = sorted({int(y[0]) for y in years if y[0] is not None})
-            return years
+            year = sqlalchemy.extract('year', MasterCase.date_of_service)
+            years = session.scalars(
+                sqlalchemy.select(year).distinct()
+                .where(MasterCase.date_of_service.isnot(None)).order_by(year)
+            ).all()
+            return [int(y) for y in years]
         finally:
             session.close()
 
+    @_db_cache
     def get_master_case_analysis(self, year=None):
         """Get comprehensive analysis of master cases for a specific year (or latest year if not provided)."""
         session = get_session()
         try:
-            cases = session.query(MasterCase).filter(MasterCase.date_of_service.isnot(None)).all()
-            available_years = sorted({c.date_of_service.year for c in cases if c.date_of_service})
+            # Year-over-year totals are aggregated in SQL, so only the
+            # selected year's cases are read as rows
+            yearly_totals = self._case_totals_by(session, sqlalchemy.extract('year', MasterCase.date_of_service))
+            available_years = sorted(row.period for row in yearly_totals)
             if not available_years:
                 return {}
             if year is None:
                 year = max(available_years)
-            # Filter cases for the selected year
-            cases_for_year = [c for c in cases if c.date_of_service and c.date_of_service.year == year]
-            # Pass all cases for year-over-year, but only cases_for_year for monthly, weekly, etc.
-            yearly_data = self._analyze_yearly_data(cases)
-            monthly_data = self._analyze_monthly_data(cases_for_year, year)
+            # Plain rows of just the columns the analysis reads, instead of
+            # full ORM instances registered in the session's identity map
+            in_year = self._in_year(year)
+            measures = (MasterCase.total_anes_time, MasterCase.total_anes_base_units,
+                        MasterCase.total_med_base_units, MasterCase.asmg_units)
+            cases_for_year = session.execute(
+                sqlalchemy.select(
+                    MasterCase.patient_ticket_number,
+                    MasterCase.date_of_service,
+                    MasterCase.cpt_code,
+                    *measures
+                ).where(in_year)
+            ).all()
+            yearly_data = self._analyze_yearly_data(yearly_totals)
+            monthly_data = self._analyze_monthly_data(
+                self._case_totals_by(session, sqlalchemy.extract('month', MasterCase.date_of_service), in_year),
+                year)
             weekly_data = self._analyze_weekly_data(cases_for_year, year)
             seasonal_data = self._analyze_seasonal_data(cases_for_year, year)
             regional_data = self._analyze_regional_anesthesia(cases_for_year, year)
             cpt_data = self._analyze_cpt_codes(cases_for_year, year)
             # Find extremes in the selected year
             if cases_for_year:
-                longest_case = max(cases_for_year, key=lambda x: x.total_anes_time or 0)
-                most_anes_units = max(cases_for_year, key=lambda x: x.total_anes_base_units or 0)
-                most_med_units = max(cases_for_year, key=lambda x: x.total_med_base_units or 0)
-                most_asmg_units = max(cases_for_year, key=lambda x: x.asmg_units or 0)
+                # One float column per measure, NULLs as 0; argmax picks the
+                # first of equal values, like max() did. The measures are the
+                # last columns, and slicing a row is much cheaper than reading
+                # its attributes one by one
+                values = np.nan_to_num(np.array(
+                    [case[-len(measures):] for case in cases_for_year], dtype=float))
+                longest_case, most_anes_units, most_med_units, most_asmg_units = (
+                    cases_for_year[i] for i in values.argmax(axis=0))
             else:
                 longest_case = most_anes_units = most_med_units = most_asmg_units = None
             return {
@@ -637,28 +915,54 @@ class CompensationAnalyzer:
         finally:
             session.close()
 
-    def _analyze_yearly_data(self, cases):
+    @staticmethod
+    def _in_year(year):
+        """Filter for cases dated in the given year; a date range, so it can use the index."""
+        from datetime import date
+        return sqlalchemy.and_(MasterCase.date_of_service >= date(year, 1, 1),
+                               MasterCase.date_of_service < date(year + 1, 1, 1))
+
+    def _case_totals_by(self, session, period, *criteria):
+        """
+        Case count, totals and latest date of service per period, in one GROUP BY.
+        
+        Args:
+            period: SQL expression to group by, e.g. the year of the date of service
+            criteria: Extra filters on the cases
+            
+        Returns:
+            list: Rows of period, cases, total_time, total_anes_units,
+                total_med_units, total_asmg_units and latest_date
+        """
+        period = period.label('period')
+        return session.execute(
+            sqlalchemy.select(
+                period,
+                func.count().label('cases'),
+                func.coalesce(func.sum(MasterCase.total_anes_time), 0).label('total_time'),
+                func.coalesce(func.sum(MasterCase.total_anes_base_units), 0).label('total_anes_units'),
+                func.coalesce(func.sum(MasterCase.total_med_base_units), 0).label('total_med_units'),
+                func.coalesce(func.sum(MasterCase.asmg_units), 0).label('total_asmg_units'),
+                func.max(MasterCase.date_of_service).label('latest_date')
+            ).where(MasterCase.date_of_service.isnot(None), *criteria).group_by(period)
+        ).all()
+
+    def _analyze_yearly_data(self, yearly_totals):
         """Analyze data by year with year-over-year comparisons."""
-        from collections import defaultdict
         import datetime
         
-        yearly_stats = defaultdict(lambda: {
-            'cases': 0, 'total_time': 0, 'total_anes_units': 0, 
-            'total_med_units': 0, 'total_asmg_units': 0,
-            'avg_time_per_case': 0, 'avg_anes_units_per_case': 0,
-            'avg_med_units_per_case': 0, 'avg_asmg_units_per_case': 0
-        })
-        
         current_year = datetime.date.today().year
         
-        for case in cases:
-            if case.date_of_service:
-                year = case.date_of_service.year
-                yearly_stats[year]['cases'] += 1
-                yearly_stats[year]['total_time'] += case.total_anes_time or 0
-                yearly_stats[year]['total_anes_units'] += case.total_anes_base_units or 0
-                yearly_stats[year]['total_med_units'] += case.total_med_base_units or 0
-                yearly_stats[year]['total_asmg_units'] += case.asmg_units or 0
+        yearly_stats = {}
+        for row in yearly_totals:
+            yearly_stats[row.period] = {
+                'cases': row.cases, 'total_time': row.total_time,
+                'total_anes_units': row.total_anes_units,
+                'total_med_units': row.total_med_units,
+                'total_asmg_units': row.total_asmg_units,
+                'avg_time_per_case': 0, 'avg_anes_units_per_case': 0,
+                'avg_med_units_per_case': 0, 'avg_asmg_units_per_case': 0
+            }
         
         # Calculate averages
         for year in yearly_stats:
@@ -684,28 +988,27 @@ class CompensationAnalyzer:
             }
         
         return {
-            'yearly_stats': dict(yearly_stats),
+            'yearly_stats': yearly_stats,
             'yoy_growth': yoy_growth,
             'current_year': current_year,
             'years_with_data': years
         }
 
-    def _analyze_monthly_data(self, cases, year):
+    def _analyze_monthly_data(self, monthly_totals, year):
         import datetime
         today = datetime.date.today()
         is_current_year = (year == today.year)
         last_month = today.month if is_current_year else 12
         # Prepare stats for all months up to current month
         monthly_stats = {m: {'cases': 0, 'total_time': 0, 'total_anes_units': 0, 'total_med_units': 0, 'total_asmg_units': 0} for m in range(1, last_month+1)}
-        for case in cases:
-            if case.date_of_service and case.date_of_service.year == year:
-                month = case.date_of_service.month
-                if month in monthly_stats:
-                    monthly_stats[month]['cases'] += 1
-                    monthly_stats[month]['total_time'] += case.total_anes_time or 0
-                    monthly_stats[month]['total_anes_units'] += case.total_anes_base_units or 0
-                    monthly_stats[month]['total_med_units'] += case.total_med_base_units or 0
-                    monthly_stats[month]['total_asmg_units'] += case.asmg_units or 0
+        for row in monthly_totals:
+            if row.period in monthly_stats:
+                monthly_stats[row.period] = {
+                    'cases': row.cases, 'total_time': row.total_time,
+                    'total_anes_units': row.total_anes_units,
+                    'total_med_units': row.total_med_units,
+                    'total_asmg_units': row.total_asmg_units
+                }
         # Year-to-date is the sum for the selected year up to current month
         ytd_stats = {
             'cases': sum(monthly_stats[m]['cases'] for m in monthly_stats),
@@ -721,11 +1024,7 @@ class CompensationAnalyzer:
         start_of_year = date(year, 1, 1)
         
         # Find the latest date in the cases for this year
-        latest_date = None
-        for case in cases:
-            if case.date_of_service and case.date_of_service.year == year:
-                if latest_date is None or case.date_of_service > latest_date:
-                    latest_date = case.date_of_service
+        latest_date = max((row.latest_date for row in monthly_totals), default=None)
         
         # Use the latest date from data, or current date if no data
         end_date = latest_date if latest_date else (date.today() if is_current_year else date(year, 12, 31))
@@ -832,13 +1131,13 @@ class CompensationAnalyzer:
         
         # Analyze by temporal periods (using ASMG rules)
         temporal_analysis = defaultdict(lambda: {'cases': 0, 'total_med_units': 0})
+        # One calculator for the loop so the rules are loaded only once
+        calculator = ASMGCalculator(self.session)
         
         for case in regional_cases:
             if case.date_of_service:
                 # Determine temporal period based on ASMG rules
                 try:
-                    from asmg_calculator import ASMGCalculator
-                    calculator = ASMGCalculator(self.session)
                     rule = calculator.get_applicable_rule(case.date_of_service)
                     period = rule.description if rule and rule.description else 'Unknown'
                 except:
@@ -904,6 +1203,7 @@ class CompensationAnalyzer:
             'cpt_details': cpt_averages
         }
 
+    @_db_cache
     def get_cpt_codes_with_history(self) -> dict:
         """
         Get CPT codes with their anesthesia base units and historical tracking.
@@ -937,14 +1237,13 @@ class CompensationAnalyzer:
             ORDER BY ct.cpt_code, ct.date_of_service
             """
             
-            df = pd.read_sql_query(query, self.engine)
+            df = self._read_sql(query, parse_dates=['created_at'])
             
             if df.empty:
                 return {}
             
             # Convert date_of_service to datetime - handle M/D/YY format
             df['date_of_service'] = pd.to_datetime(df['date_of_service'], format='%m/%d/%y', errors='coerce')
-            df['created_at'] = pd.to_datetime(df['created_at'])
             
             # Filter to last 5 years
             df = df[df['date_of_service'] >= pd.Timestamp(five_years_ago)]
@@ -960,15 +1259,11 @@ class CompensationAnalyzer:
             
             logger.info(f"Filtered to {len(df)} standard unit cases (excluded {5600 - len(df)} split cases)")
             
-            # Group by CPT code and analyze
+            # Group by CPT code and analyze; one groupby pass instead of
+            # re-scanning the whole frame with a mask for every code
             cpt_data = {}
             
-            for cpt_code in df['cpt_code'].unique():
-                cpt_df = df[df['cpt_code'] == cpt_code].copy()
-                
-                if cpt_df.empty:
-                    continue
-                
+            for cpt_code, cpt_df in df.groupby('cpt_code', sort=False):
                 # Get current anesthesia base units (most recent non-null value)
                 non_null_units = cpt_df['anes_base_units'].dropna()
                 current_anes_units = non_null_units.iloc[-1] if not non_null_units.empty else None
@@ -978,8 +1273,8 @@ class CompensationAnalyzer:
                 seen_units = set()
                 
                 # Group by year and get unique anesthesia base units
-                cpt_df['year'] = cpt_df['date_of_service'].dt.year
-                yearly_units = cpt_df.groupby('year')['anes_base_units'].agg(['mean', 'min', 'max']).reset_index()
+                years = cpt_df['date_of_service'].dt.year.rename('year')
+                yearly_units = cpt_df.groupby(years)['anes_base_units'].agg(['mean', 'min', 'max']).reset_index()
                 
                 for _, row in yearly_units.iterrows():
                     year = int(row['year'])
@@ -1023,23 +1318,24 @@ class CompensationAnalyzer:
 
 def main():
     """Main function for running analysis."""
-    import numpy as np
-    
-    analyzer = CompensationAnalyzer()
-    
-    # Generate summary report
-    analyzer.generate_summary_report()
-    
-    # Generate all plots
-    print("Generating visualizations...")
-    analyzer.plot_income_trend(save_path='income_trend.png')
-    analyzer.plot_procedure_profitability(save_path='procedure_profitability.png')
-    analyzer.plot_payer_performance(save_path='payer_performance.png')
-    analyzer.plot_seasonal_trends(save_path='seasonal_trends.png')
-    analyzer.plot_commission_correlation(save_path='commission_correlation.png')
-    
-    print("Analysis complete!")
+    with CompensationAnalyzer() as analyzer:
+        # Query once for both the report and the plots
+        income_df = analyzer.get_monthly_income_trend()
+        procedure_df = analyzer.get_procedure_profitability()
+        payer_df = analyzer.get_payer_performance()
+        
+        # Generate summary report
+        analyzer.generate_summary_report(income_df, procedure_df, payer_df)
+        
+        # Generate all plots
+        print("Generating visualizations...")
+        analyzer.plot_income_trend(save_path='income_trend.png', df=income_df)
+        analyzer.plot_procedure_profitability(save_path='procedure_profitability.png', df=procedure_df)
+        analyzer.plot_payer_performance(save_path='payer_performance.png', df=payer_df)
+        analyzer.plot_seasonal_trends(save_path='seasonal_trends.png')
+        analyzer.plot_commission_correlation(save_path='commission_correlation.png')
+        
+        print("Analysis complete!")
 
 if __name__ == "__main__":
-    import numpy as np  # Import here to avoid issues if not available
     main()
\ No newline at end of file
@@ -6,7 +6,7 @@ import pandas as pd
 from datetime import datetime
 from typing import Dict, Any
 import logging
-from database_models import MonthlySummary, AnesthesiaCase, ChargeTransaction, MasterCase, get_session
+from database_models import MonthlySummary, AnesthesiaCase, ChargeTransaction, get_session
 from case_grouper import CaseGrouper
 
 # Set up logging
@@ -16,8 +16,13 @@ logger = logging.getLogger(__name__)
 class DataLoader:
     """Class to load extracted data into the database."""
     
+    # Ticket numbers per IN (...) lookup, well under SQLite's bound-parameter limit
+    _LOOKUP_CHUNK = 500
+    
     def __init__(self):
         self.session = None
+        # Ticket numbers whose master cases need rebuilding after a load
+        self.affected_tickets = set()
     
     def load_report_data(self, summary_data: Dict[str, Any], 
                         charge_transactions: pd.DataFrame, 
@@ -34,6 +39,7 @@ class DataLoader:
             bool: True if successful, False otherwise
         """
         self.session = get_session()
+        self.affected_tickets = set()
         
         try:
             # 1. Insert monthly summary
@@ -48,11 +54,11 @@ class DataLoader:
                 if not success:
                     logger.warning("Failed to insert some charge transactions")
             
-            # 3. Group transactions into master cases
-            if not charge_transactions.empty:
+            # 3. Group transactions into master cases (only the tickets touched by this report)
+            if self.affected_tickets:
                 try:
                     grouper = CaseGrouper(self.session)
-                    grouper.group_transactions_into_cases()
+                    grouper.group_transactions_into_cases(only_tickets=self.affected_tickets)
                     stats = grouper.get_case_statistics()
                     logger.info(f"Case grouping completed: {stats['total_cases']} cases created from {stats['linked_transactions']} transactions")
                 except Exception as e:
@@ -88,13 +94,18 @@ class DataLoader:
             
             if existing:
                 logger.warning(f"Report {summary_data['source_file']} already exists. Deleting old data before re-inserting.")
+                # The old report's tickets need their master cases rebuilt (or
+                # removed) once its transactions are gone
+                self.affected_tickets.update(
+                    ticket for (ticket,) in self.session.query(ChargeTransaction.phys_ticket_ref)
+                    .filter_by(summary_id=existing.id).distinct()
+                    if ticket
+                )
+                
                 # Delete associated records first to maintain referential integrity
                 self.session.query(ChargeTransaction).filter_by(summary_id=existing.id).delete(synchronize_session=False)
                 self.session.query(AnesthesiaCase).filter_by(summary_id=existing.id).delete(synchronize_session=False)
                 
-                # Clear all master cases since they're derived from transactions
-                self.session.query(MasterCase).delete(synchronize_session=False)
-                
                 # Now delete the summary record
                 self.session.delete(existing)
                 self.session.flush()  # Ensure deletion is processed before inserting new data
@@ -124,7 +135,13 @@ class DataLoader:
         """Insert or update charge transaction data with proper type conversions."""
         try:
             upserted_count = 0
-            for _, row in df.iterrows():
+            # Parse both date columns once up front rather than per row
+            dates_of_service = self._parse_mdy_dates(df, 'Date of Service')
+            dates_of_post = self._parse_mdy_dates(df, 'Date of Post')
+            # Existing transactions for this report's tickets, fetched up front
+            # instead of one lookup per row
+            existing_transactions = self._existing_transactions(df)
+            for pos, (_, row) in enumerate(df.iterrows()):
                 try:
                     case_id = str(row.get('Phys Ticket Ref#', '')).strip()
                     if not case_id or case_id.lower() in ['nan', 'none', '']:
@@ -147,15 +164,6 @@ class DataLoader:
                         except (ValueError, TypeError):
                             return None
 
-                    def clean_date_field(value):
-                        """Convert M/D/YY string to date object, return None for invalid values."""
-                        if value is None or str(value).strip().lower() in ['', 'nan', 'none']:
-                            return None
-                        try:
-                            return datetime.strptime(str(value).strip(), '%m/%d/%y').date()
-                        except (ValueError, TypeError):
-                            return None
-
                     # Build record with proper types
                     record_data = {
                         'summary_id': summary_id,
@@ -171,8 +179,8 @@ class DataLoader:
                         'stop_time': clean_string_field(row.get('Stop Time', '')),
                         'ob_case_pos': clean_string_field(row.get('OB Case Pos', '')),
                         # Date fields
-                        'date_of_service': clean_date_field(row.get('Date of Service', '')),
-                        'date_of_post': clean_date_field(row.get('Date of Post', '')),
+                        'date_of_service': dates_of_service[pos],
+                        'date_of_post': dates_of_post[pos],
                         # Numeric fields
                         'split_percent': clean_numeric_field(row.get('Split %', '')),
                         'anes_time_min': clean_numeric_field(row.get('Anes Time (Min)', '')),
@@ -192,13 +200,9 @@ class DataLoader:
 
                     # Use a composite key to find the existing transaction
                     # Include start_time AND stop_time to differentiate split cases
-                    existing_transaction = self.session.query(ChargeTransaction).filter_by(
-                        phys_ticket_ref=case_id,
-                        cpt_code=record_data['cpt_code'],
-                        date_of_service=record_data['date_of_service'],
-                        start_time=record_data['start_time'],
-                        stop_time=record_data['stop_time']
-                    ).first()
+                    key = (case_id, record_data['cpt_code'], record_data['date_of_service'],
+                           record_data['start_time'], record_data['stop_time'])
+                    existing_transaction = existing_transactions.get(key)
 
                     if existing_transaction:
                         # Update the existing record
@@ -208,6 +212,8 @@ class DataLoader:
                         # Insert a new record
                         new_transaction = ChargeTransaction(**record_data)
                         self.session.add(new_transaction)
+                        existing_transactions[key] = new_transaction
+                    self.affected_tickets.add(record_data['phys_ticket_ref'])
 
                     upserted_count += 1
                 except Exception as e:
@@ -220,6 +226,35 @@ class DataLoader:
             logger.error(f"Error upserting charge transactions: {str(e)}")
             return False
     
+    def _existing_transactions(self, df: pd.DataFrame) -> dict:
+        """Existing transactions for the tickets in df, keyed by
+        (ticket, CPT code, date of service, start time, stop time).
+        """
+        if 'Phys Ticket Ref#' not in df.columns:
+            return {}
+        tickets = list(set(df['Phys Ticket Ref#'].astype(str).str.strip()))
+        existing = {}
+        for start in range(0, len(tickets), self._LOOKUP_CHUNK):
+            chunk = tickets[start:start + self._LOOKUP_CHUNK]
+            query = (self.session.query(ChargeTransaction)
+                     .filter(ChargeTransaction.phys_ticket_ref.in_(chunk))
+                     .order_by(ChargeTransaction.id))
+            for transaction in query:
+                key = (transaction.phys_ticket_ref, transaction.cpt_code, transaction.date_of_service,
+                       transaction.start_time, transaction.stop_time)
+                existing.setdefault(key, transaction)
+        return existing
+    
+    def _parse_mdy_dates(self, df: pd.DataFrame, column: str) -> list:
+        """Parse an M/D/YY date column in one vectorized pass.
+        
+        Returns one date per row, with None for missing or invalid values.
+        """
+        if column not in df.columns:
+            return [None] * len(df)
+        parsed = pd.to_datetime(df[column].astype(str).str.strip(), format='%m/%d/%y', errors='coerce')
+        return parsed.dt.date.astype(object).where(parsed.notna(), None).tolist()
+    
     def _insert_anesthesia_cases(self, df: pd.DataFrame, summary_id: int) -> bool:
         """Insert or update anesthesia case data from ticket tracking."""
         try:
@@ -237,6 +272,16 @@ class DataLoader:
                     df_mapped = df_mapped.rename(columns={old_name: new_name})
             
             upserted_count = 0
+            # Existing cases fetched in one query instead of one lookup per row
+            existing_cases = {}
+            if 'case_id' in df_mapped.columns:
+                case_ids = list(set(df_mapped['case_id'].astype(str).str.strip()))
+                for start in range(0, len(case_ids), self._LOOKUP_CHUNK):
+                    chunk = case_ids[start:start + self._LOOKUP_CHUNK]
+                    for case in (self.session.query(AnesthesiaCase)
+                                 .filter(AnesthesiaCase.case_id.in_(chunk))
+                                 .order_by(AnesthesiaCase.id)):
+                        existing_cases.setdefault(case.case_id, case)
             for _, row in df_mapped.iterrows():
                 try:
                     case_id = str(row.get('case_id', '')).strip()
@@ -250,7 +295,7 @@ class DataLoader:
                         'commission_earned': self._parse_monetary_value(row.get('commission_earned'))
                     }
 
-                    existing_case = self.session.query(AnesthesiaCase).filter_by(case_id=case_id).first()
+                    existing_case = existing_cases.get(case_id)
 
                     if existing_case:
                         for key, value in record_data.items():
@@ -258,6 +303,7 @@ class DataLoader:
                     else:
                         new_case = AnesthesiaCase(case_id=case_id, **record_data)
                         self.session.add(new_case)
+                        existing_cases[case_id] = new_case
                     
                     upserted_count += 1
                 except Exception as e:
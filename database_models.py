@@ -2,11 +2,14 @@
 Database models for the Anesthesia Compensation & Practice Analysis Pipeline.
 """
 
-from sqlalchemy import create_engine, Column, Integer, String, Date, REAL, ForeignKey, DateTime, Index
-from sqlalchemy.orm import declarative_base, sessionmaker, relationship
+from sqlalchemy import create_engine, event, Column, Integer, String, Date, REAL, ForeignKey, DateTime, Index, func
+from sqlalchemy.orm import declarative_base, sessionmaker, relationship, scoped_session
 from datetime import datetime
+import logging
 import os
 
+logger = logging.getLogger(__name__)
+
 # Database configuration
 DATABASE_URL = "sqlite:///compensation.db"
 
@@ -14,6 +17,93 @@ DATABASE_URL = "sqlite:///compensation.db"
 engine = create_engine(DATABASE_URL, echo=False)
 Base = declarative_base()
 
+@event.listens_for(engine, "connect")
+def _set_sqlite_pragmas(dbapi_connection, connection_record):
+    """Use WAL with synchronous=NORMAL so commits don't fsync.
+
+    Bulk loads commit once per report (and the grouper commits per run); with
+    the default rollback journal and synchronous=FULL each of those waits on
+    the disk. WAL only syncs at checkpoints, stays crash-safe, and lets the
+    web app keep reading while a load is writing.
+    """
+    cursor = dbapi_connection.cursor()
+    cursor.execute("PRAGMA journal_mode=WAL")
+    cursor.execute("PRAGMA synchronous=NORMAL")
+    cursor.execute("PRAGMA temp_store=MEMORY")
+    cursor.close()
+
+def _dedupe_asmg_rules(cursor):
+    """Keep only the most recently added rule for each effective date."""
+    cursor.execute("""
+    DELETE FROM asmg_temporal_rules
+    WHERE id NOT IN (SELECT MAX(id) FROM asmg_temporal_rules GROUP BY effective_date)
+    """)
+    if cursor.rowcount:
+        logger.info(f"Removed {cursor.rowcount} duplicate ASMG rules")
+
+def remove_duplicate_master_cases(cursor):
+    """Collapse master cases that share a ticket number onto the lowest id.
+
+    Older databases could hold more than one case per ticket, which would
+    stop the unique patient_ticket_number index from being created.
+    """
+    cursor.execute("""
+    UPDATE charge_transactions
+    SET master_case_id = (
+        SELECT MIN(keep.id) FROM master_cases keep
+        JOIN master_cases dup ON dup.patient_ticket_number = keep.patient_ticket_number
+        WHERE dup.id = charge_transactions.master_case_id
+    )
+    WHERE master_case_id IS NOT NULL
+    """)
+    cursor.execute("""
+    DELETE FROM master_cases
+    WHERE id NOT IN (SELECT MIN(id) FROM master_cases GROUP BY patient_ticket_number)
+    """)
+    if cursor.rowcount:
+        logger.info(f"Removed {cursor.rowcount} duplicate master cases")
+
+# Unique indexes the upserts depend on: (index, table, column, dedupe function)
+_UPSERT_INDEXES = [
+    ('idx_asmg_effective_date', 'asmg_temporal_rules', 'effective_date', _dedupe_asmg_rules),
+    ('idx_mc_patient_ticket', 'master_cases', 'patient_ticket_number', remove_duplicate_master_cases),
+]
+
+@event.listens_for(engine, "first_connect")
+def _ensure_upsert_indexes(dbapi_connection, connection_record):
+    """Add the unique indexes INSERT ... ON CONFLICT needs to existing tables.
+
+    create_all() never adds an index to a table that already exists, so
+    databases created before these indexes would make every upsert fail.
+    Duplicates are removed first, since they would stop the index from being
+    created. Runs once per process, on its first connection.
+    """
+    cursor = dbapi_connection.cursor()
+    try:
+        for index, table, column, dedupe in _UPSERT_INDEXES:
+            cursor.execute("SELECT 1 FROM sqlite_master WHERE type='table' AND name=?", (table,))
+            if not cursor.fetchone():
+                continue  # create_all() creates the table with its index
+            # PRAGMA index_list rows are (seq, name, unique, origin, partial)
+            cursor.execute(f"PRAGMA index_list({table})")
+            if any(row[1] == index and row[2] for row in cursor.fetchall()):
+                continue
+            dedupe(cursor)
+            cursor.execute(f"DROP INDEX IF EXISTS {index}")
+            cursor.execute(f"CREATE UNIQUE INDEX {index} ON {table} ({column})")
+            logger.info(f"Created unique index {index}")
+        dbapi_connection.commit()
+    except Exception as e:
+        dbapi_connection.rollback()
+        logger.warning(f"Could not create the unique indexes upserts need: {str(e)}")
+    finally:
+        cursor.close()
+
+# Session factory, built once. Session hands out one session per thread for
+# long-lived shared objects; the web app removes it at the end of each request.
+SessionLocal = sessionmaker(bind=engine)
+Session = scoped_session(SessionLocal)
+
 class MonthlySummary(Base):
     """Table to store monthly compensation summary data."""
     __tablename__ = 'monthly_summary'
@@ -28,16 +118,19 @@ class MonthlySummary(Base):
     source_file = Column(String, nullable=False)
     created_at = Column(DateTime, default=datetime.utcnow)
     
-    # Relationships
-    anesthesia_cases = relationship("AnesthesiaCase", back_populates="summary")
-    charge_transactions = relationship("ChargeTransaction", back_populates="summary")
+    # Relationships (children are removed with their report; passive_deletes
+    # stops the ORM from loading them just to delete the summary)
+    anesthesia_cases = relationship("AnesthesiaCase", back_populates="summary",
+                                    cascade="all, delete-orphan", passive_deletes=True)
+    charge_transactions = relationship("ChargeTransaction", back_populates="summary",
+                                       cascade="all, delete-orphan", passive_deletes=True)
 
 class AnesthesiaCase(Base):
     """Table to store individual anesthesia case data from Ticket Tracking Report."""
     __tablename__ = 'anesthesia_cases'
     
     id = Column(Integer, primary_key=True)
-    summary_id = Column(Integer, ForeignKey('monthly_summary.id'), nullable=False)
+    summary_id = Column(Integer, ForeignKey('monthly_summary.id', ondelete='CASCADE'), nullable=False)
     case_id = Column(String, nullable=True)  # e.g., Ticket Number
     case_type = Column(String, nullable=True)  # e.g., Anesthesia Type
     date_closed = Column(Date, nullable=True)
@@ -58,7 +151,11 @@ class ASMGTemporalRules(Base):
     med_units_multiplier = Column(REAL, nullable=False, default=0.6)  # Multiplier for medical base units
     description = Column(String, nullable=True)  # Optional description of the rule
     created_at = Column(DateTime, default=datetime.utcnow)
-    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    # Stamped by SQLite (CURRENT_TIMESTAMP, UTC) on insert and on every update
+    updated_at = Column(DateTime, server_default=func.now(), onupdate=func.now())
+
+# At most one rule per effective date; add_rule upserts against this index
+Index('idx_asmg_effective_date', ASMGTemporalRules.effective_date, unique=True)
 
 class MasterCase(Base):
     """A master case that groups multiple charge transactions by patient ticket number."""
@@ -92,8 +189,12 @@ class MasterCase(Base):
     charge_transactions = relationship("ChargeTransaction", back_populates="master_case")
 
 # Define indexes for master_cases
-Index('idx_mc_patient_ticket', MasterCase.patient_ticket_number)
-Index('idx_mc_date_service', MasterCase.date_of_service)
+Index('idx_mc_patient_ticket', MasterCase.patient_ticket_number, unique=True)
+# The yearly and monthly case totals filter and group on the date of service
+# and only sum the unit and time columns, so the index covers them as well
+Index('idx_mc_date_service', MasterCase.date_of_service, MasterCase.asmg_units,
+      MasterCase.total_anes_time, MasterCase.total_anes_base_units,
+      MasterCase.total_med_base_units)
 
 class ChargeTransaction(Base):
     """Table to store charge transaction data from ChargeTransaction Report.
@@ -111,7 +212,7 @@ class ChargeTransaction(Base):
     __tablename__ = 'charge_transactions'
 
     id = Column(Integer, primary_key=True)
-    summary_id = Column(Integer, ForeignKey('monthly_summary.id'), nullable=False)
+    summary_id = Column(Integer, ForeignKey('monthly_summary.id', ondelete='CASCADE'), nullable=False)
     master_case_id = Column(Integer, ForeignKey('master_cases.id'))
 
     # String identifiers and codes
@@ -155,7 +256,12 @@ class ChargeTransaction(Base):
 # Define indexes for charge_transactions
 Index('idx_ct_phys_ticket', ChargeTransaction.phys_ticket_ref)
 Index('idx_ct_date_service', ChargeTransaction.date_of_service)
-Index('idx_ct_cpt_code', ChargeTransaction.cpt_code)
+# The procedure and payer reports group by CPT code and carrier and only read
+# the time and unit columns, so the index covers them and the table is never read
+Index('idx_ct_cpt_code', ChargeTransaction.cpt_code, ChargeTransaction.pay_code,
+      ChargeTransaction.anes_time_min, ChargeTransaction.anes_base_units,
+      ChargeTransaction.med_base_units)
+Index('idx_ct_summary', ChargeTransaction.summary_id)
 
 # Define index for monthly_summary
 Index('idx_ms_pay_period', MonthlySummary.pay_period_end_date)
@@ -166,9 +272,8 @@ def create_database():
     print("Database tables created successfully.")
 
 def get_session():
-    """Get a database session."""
-    Session = sessionmaker(bind=engine)
-    return Session()
+    """Get a new database session (the caller closes it)."""
+    return SessionLocal()
 
 if __name__ == "__main__":
     # Create the database when this file is run directly
@@ -27,6 +27,12 @@ def migrate_asmg_rules():
             
             if result.fetchone():
                 print("Found existing ASMG rules table. Skipping table creation.")
+                # Older tables predate the unique effective_date index
+                conn.execute(text("""
+                    CREATE UNIQUE INDEX IF NOT EXISTS idx_asmg_effective_date
+                    ON asmg_temporal_rules (effective_date)
+                """))
+                conn.commit()
             else:
                 print("Creating new ASMG rules table...")
                 # Create new table
@@ -5,7 +5,7 @@ Migration script to add ASMG units column to MasterCase table and calculate ASMG
 
 import logging
 import sys
-from sqlalchemy import text
+from sqlalchemy import select, text, update
 from database_models import get_session, MasterCase
 from asmg_calculator import ASMGCalculator
 
@@ -41,27 +41,35 @@ def migrate_asmg_units():
         logger.info("Calculating ASMG units for existing cases...")
         calculator = ASMGCalculator(session)
         
-        cases = session.query(MasterCase).all()
-        updated_count = 0
+        # Plain row tuples; only these columns are needed for the calculation
+        cases = session.execute(select(
+            MasterCase.id,
+            MasterCase.date_of_service,
+            MasterCase.total_anes_base_units,
+            MasterCase.total_anes_time,
+            MasterCase.total_med_base_units
+        )).all()
+        updates = {case.id: 0.0 for case in cases}
+        dated_cases = [case for case in cases if case.date_of_service]
         
-        for case in cases:
-            try:
-                if case.date_of_service:
-                    asmg_units = calculator.calculate_asmg_units(
-                        case_date=case.date_of_service,
-                        total_anes_units=case.total_anes_base_units or 0.0,
-                        total_anes_time=case.total_anes_time or 0.0,
-                        total_med_units=case.total_med_base_units or 0.0
-                    )
-                    case.asmg_units = asmg_units
-                    updated_count += 1
-                else:
-                    case.asmg_units = 0.0
-                    updated_count += 1
-            except Exception as e:
-                logger.warning(f"Error calculating ASMG units for case {case.id}: {str(e)}")
-                case.asmg_units = 0.0
-                updated_count += 1
+        # One vectorized pass over every case with a date of service
+        if dated_cases:
+            asmg_units = calculator.calculate_asmg_units_batch(
+                [case.date_of_service for case in dated_cases],
+                [case.total_anes_base_units or 0.0 for case in dated_cases],
+                [case.total_anes_time or 0.0 for case in dated_cases],
+                [case.total_med_base_units or 0.0 for case in dated_cases]
+            )
+            for case, units in zip(dated_cases, asmg_units.tolist()):
+                updates[case.id] = units
+        
+        # Bulk UPDATE by primary key
+        if updates:
+            session.execute(update(MasterCase), [
+                {'id': case_id, 'asmg_units': units} for case_id, units in updates.items()
+            ])
+        
+        updated_count = len(cases)
         
         session.commit()
         logger.info(f"Successfully updated ASMG units for {updated_count} cases.")
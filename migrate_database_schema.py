@@ -16,6 +16,8 @@ from datetime import datetime
 from pathlib import Path
 import logging
 
+from database_models import remove_duplicate_master_cases
+
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
@@ -29,7 +31,15 @@ def backup_database():
         return False
 
     logger.info(f"Creating backup: {BACKUP_PATH}")
-    shutil.copy2(DB_PATH, BACKUP_PATH)
+    # The backup API also picks up changes still in the WAL file, which a
+    # plain file copy would miss
+    source = sqlite3.connect(DB_PATH)
+    backup = sqlite3.connect(BACKUP_PATH)
+    try:
+        source.backup(backup)
+    finally:
+        backup.close()
+        source.close()
     logger.info("Backup created successfully")
     return True
 
@@ -173,6 +183,17 @@ def migrate_charge_transactions(conn):
 
     conn.commit()
 
+def dedupe_master_cases(conn):
+    """Collapse master cases that share a ticket number, so the unique index can be created."""
+    cursor = conn.cursor()
+
+    cursor.execute("SELECT name FROM sqlite_master WHERE type='table' AND name='master_cases'")
+    if not cursor.fetchone():
+        return
+
+    remove_duplicate_master_cases(cursor)
+    conn.commit()
+
 def add_indexes(conn):
     """Add indexes for frequently queried columns."""
     logger.info("Adding database indexes...")
@@ -180,15 +201,20 @@ def add_indexes(conn):
     cursor = conn.cursor()
 
     indexes = [
-        ("idx_ct_phys_ticket", "charge_transactions", "phys_ticket_ref"),
-        ("idx_ct_date_service", "charge_transactions", "date_of_service"),
-        ("idx_ct_cpt_code", "charge_transactions", "cpt_code"),
-        ("idx_mc_patient_ticket", "master_cases", "patient_ticket_number"),
-        ("idx_mc_date_service", "master_cases", "date_of_service"),
-        ("idx_ms_pay_period", "monthly_summary", "pay_period_end_date"),
+        ("idx_ct_phys_ticket", "charge_transactions", "phys_ticket_ref", False),
+        ("idx_ct_date_service", "charge_transactions", "date_of_service", False),
+        ("idx_ct_cpt_code", "charge_transactions", "cpt_code, pay_code, anes_time_min, anes_base_units, med_base_units", False),
+        ("idx_ct_summary", "charge_transactions", "summary_id", False),
+        ("idx_mc_patient_ticket", "master_cases", "patient_ticket_number", True),
+        ("idx_mc_date_service", "master_cases", "date_of_service, asmg_units, total_anes_time, total_anes_base_units, total_med_base_units", False),
+        ("idx_ms_pay_period", "monthly_summary", "pay_period_end_date", False),
     ]
 
-    for idx_name, table_name, column_name in indexes:
+    # Indexes no query uses any more
+    for idx_name in ("idx_ct_pay_code",):
+        cursor.execute(f"DROP INDEX IF EXISTS {idx_name}")
+
+    for idx_name, table_name, columns, unique in indexes:
         try:
             # Check if table exists
             cursor.execute(f"SELECT name FROM sqlite_master WHERE type='table' AND name='{table_name}'")
@@ -200,7 +226,8 @@ def add_indexes(conn):
             cursor.execute(f"DROP INDEX IF EXISTS {idx_name}")
 
             # Create index
-            cursor.execute(f"CREATE INDEX {idx_name} ON {table_name}({column_name})")
+            unique_sql = "UNIQUE " if unique else ""
+            cursor.execute(f"CREATE {unique_sql}INDEX {idx_name} ON {table_name}({columns})")
             logger.info(f"Created index: {idx_name}")
         except Exception as e:
             logger.warning(f"Error creating index {idx_name}: {str(e)}")
@@ -229,7 +256,8 @@ def main():
         # Step 3: Migrate charge_transactions
         migrate_charge_transactions(conn)
 
-        # Step 4: Add indexes
+        # Step 4: Add indexes (the unique ticket index needs duplicates gone first)
+        dedupe_master_cases(conn)
         add_indexes(conn)
 
         logger.info("=" * 60)
@@ -6,6 +6,8 @@ Implements batch processing for historical data and single file processing.
 import os
 import logging
 import argparse
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
 from datetime import datetime
 from data_extractor import MedicalReportExtractor
@@ -26,13 +28,19 @@ def setup_logging(log_file='processing.log'):
 
 logger = logging.getLogger(__name__)
 
+def _extract_report(file_path: str):
+    """Parse one PDF in a worker process (module level so it can be pickled)."""
+    return MedicalReportExtractor().extract_data_from_report(file_path)
+
 class ReportProcessor:
     """Main class for processing compensation reports."""
     
-    def __init__(self, archive_processed=True):
+    def __init__(self, archive_processed=True, archive_dir=None):
         self.extractor = MedicalReportExtractor()
         self.loader = DataLoader()
         self.archive_processed = archive_processed
+        # Where processed files are moved; by default an "archive" folder next to each file
+        self.archive_dir = Path(archive_dir) if archive_dir else None
         self.stats = {
             'total_files': 0,
             'processed_successfully': 0,
@@ -67,21 +75,84 @@ class ReportProcessor:
             
             summary_data, charge_transactions, ticket_tracking = self.extractor.extract_data_from_report(file_path)
             
-            success = self.loader.load_report_data(summary_data, charge_transactions, ticket_tracking)
-            
-            if success:
-                logger.info(f"Successfully processed: {file_path}")
-                if self.archive_processed:
-                    self._archive_file(file_path)
-                return True
-            else:
-                logger.error(f"Failed to load data for: {file_path}")
-                return False
+            return self._load_extracted(file_path, summary_data, charge_transactions, ticket_tracking)
                 
         except Exception as e:
             logger.error(f"Error processing {file_path}: {str(e)}")
             return False
     
+    def process_files(self, file_paths, max_workers=None) -> dict:
+        """
+        Process several PDF files, parsing them in parallel.
+        
+        PDF parsing is CPU-bound, so files are extracted in a process pool;
+        the database loads then run one at a time in this process, since
+        SQLite only allows a single writer.
+        
+        Args:
+            file_paths (list): Paths to the PDF files
+            max_workers (int): Worker processes (default: one per CPU)
+            
+        Returns:
+            dict: File path -> True if processed (or skipped), False otherwise
+        """
+        results = {}
+        to_extract = []
+        for file_path in file_paths:
+            file_name = os.path.basename(file_path)
+            if self._is_already_processed(file_name):
+                logger.info(f"Skipping already processed file: {file_name}")
+                self.stats['skipped_files'].append(file_name)
+                results[file_path] = True
+            elif not os.path.exists(file_path):
+                logger.error(f"File not found: {file_path}")
+                results[file_path] = False
+            else:
+                to_extract.append(file_path)
+        
+        if not to_extract:
+            return results
+        if len(to_extract) == 1:
+            # Not worth starting a pool for a single file
+            results[to_extract[0]] = self.process_single_file(to_extract[0])
+            return results
+        
+        workers = min(len(to_extract), max_workers or os.cpu_count() or 1)
+        # spawn, not fork: this runs inside the threaded web app, and a forked
+        # child could inherit locks held by other threads
+        with ProcessPoolExecutor(max_workers=workers,
+                                 mp_context=multiprocessing.get_context('spawn')) as executor:
+            futures = {file_path: executor.submit(_extract_report, file_path)
+                       for file_path in to_extract}
+            for file_path, future in futures.items():
+                try:
+                    extracted = future.result()
+                    # The same file name may appear twice in one batch
+                    if self._is_already_processed(os.path.basename(file_path)):
+                        logger.info(f"Skipping already processed file: {file_path}")
+                        self.stats['skipped_files'].append(os.path.basename(file_path))
+                        results[file_path] = True
+                        continue
+                    results[file_path] = self._load_extracted(file_path, *extracted)
+                except Exception as e:
+                    logger.error(f"Error processing {file_path}: {str(e)}")
+                    results[file_path] = False
+        
+        return results
+    
+    def _load_extracted(self, file_path, summary_data, charge_transactions, ticket_tracking) -> bool:
+        """Load one file's extracted data and archive the file on success."""
+        success = self.loader.load_report_data(summary_data, charge_transactions, ticket_tracking)
+        
+        if success:
+            logger.info(f"Successfully processed: {file_path}")
+            if self.archive_processed:
+                self._archive_file(file_path)
+            return True
+        else:
+            logger.error(f"Failed to load data for: {file_path}")
+            return False
+    
     def process_directory(self, directory_path: str) -> dict:
         """
         Process all PDF files in a directory.
@@ -135,7 +206,7 @@ class ReportProcessor:
         """Move processed file to archive subdirectory."""
         try:
             file_path = Path(file_path)
-            archive_dir = file_path.parent / "archive"
+            archive_dir = self.archive_dir or file_path.parent / "archive"
             
             # Create archive directory if it doesn't exist
             archive_dir.mkdir(exist_ok=True)
@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+"""
+Test script for rebuilding master cases when reports are replaced or deleted.
+"""
+
+from datetime import date
+
+import pandas as pd
+
+from database_models import create_database, get_session, MonthlySummary, ChargeTransaction, MasterCase
+from data_loader import DataLoader
+
+# Ticket numbers and report names no real upload uses, so the check can run
+# against the working database and clean up after itself
+TICKET_PREFIX = '99990'
+SOURCE_FILES = ['regroup_test_a.pdf', 'regroup_test_b.pdf', 'regroup_test_c.pdf']
+
+def _report(source_file, rows):
+    """Summary data and a charge transaction frame for a report of (ticket, CPT code, minutes) rows."""
+    summary = {
+        'pay_period_start_date': date(2025, 1, 1),
+        'pay_period_end_date': date(2025, 1, 31),
+        'gross_pay': 1000.0,
+        'source_file': source_file,
+    }
+    transactions = pd.DataFrame([{
+        'Phys Ticket Ref#': TICKET_PREFIX + ticket, 'CPT Code': cpt_code,
+        'Date of Service': '1/15/25', 'Start Time': f'{8 + i:02d}:00', 'Stop Time': f'{9 + i:02d}:00',
+        'Anes Time (Min)': str(minutes), 'Anes Base Units': '4.0', 'Med Base Units': '1.0',
+    } for i, (ticket, cpt_code, minutes) in enumerate(rows)])
+    return summary, transactions
+
+def _load(source_file, rows):
+    summary, transactions = _report(source_file, rows)
+    assert DataLoader().load_report_data(summary, transactions, pd.DataFrame())
+
+def _cases():
+    """The test tickets' master cases as {ticket: (id, CPT codes, anesthesia time, updated_at)}."""
+    session = get_session()
+    try:
+        return {
+            case.patient_ticket_number[len(TICKET_PREFIX):]: (
+                case.id, case.cpt_code, case.total_anes_time, case.updated_at)
+            for case in session.query(MasterCase)
+            .filter(MasterCase.patient_ticket_number.like(TICKET_PREFIX + '%'))
+        }
+    finally:
+        session.close()
+
+def _summary_id(source_file):
+    session = get_session()
+    try:
+        return session.query(MonthlySummary.id).filter_by(source_file=source_file).scalar()
+    finally:
+        session.close()
+
+def _cleanup():
+    session = get_session()
+    try:
+        summary_ids = [summary_id for (summary_id,) in session.query(MonthlySummary.id)
+                       .filter(MonthlySummary.source_file.in_(SOURCE_FILES))]
+        session.query(ChargeTransaction).filter(
+            ChargeTransaction.summary_id.in_(summary_ids)).delete(synchronize_session=False)
+        session.query(MonthlySummary).filter(
+            MonthlySummary.id.in_(summary_ids)).delete(synchronize_session=False)
+        session.query(MasterCase).filter(
+            MasterCase.patient_ticket_number.like(TICKET_PREFIX + '%')).delete(synchronize_session=False)
+        session.commit()
+    finally:
+        session.close()
+
+def test_master_case_regroup():
+    """Replacing or deleting a report rebuilds only the master cases of its tickets."""
+    from app import app
+
+    create_database()
+    _cleanup()
+    try:
+        print("Loading two reports that share ticket 002, and an unrelated one...")
+        _load(SOURCE_FILES[0], [('001', '00400', 30), ('002', '00520', 40)])
+        _load(SOURCE_FILES[1], [('002', '00790', 50), ('003', '01967', 60)])
+        _load(SOURCE_FILES[2], [('009', '00840', 70)])
+        cases = _cases()
+        assert {ticket: case[1:3] for ticket, case in cases.items()} == {
+            '001': ('00400', 30.0), '002': ('00520, 00790', 90.0),
+            '003': ('01967', 60.0), '009': ('00840', 70.0)}, cases
+        unrelated = cases['009']
+        print("✅ One case per ticket, with totals across both reports")
+
+        print("Replacing the first report without ticket 002...")
+        _load(SOURCE_FILES[0], [('001', '00400', 35)])
+        cases = _cases()
+        assert cases['001'][1:3] == ('00400', 35.0), cases
+        assert cases['002'][1:3] == ('00790', 50.0), cases
+        assert cases['009'] == unrelated, cases
+        print("✅ Replaced report's cases updated, unrelated case untouched")
+
+        print("Deleting the second report...")
+        client = app.test_client()
+        client.post(f'/delete_report/{_summary_id(SOURCE_FILES[1])}')
+        cases = _cases()
+        assert set(cases) == {'001', '009'}, cases
+        assert cases['009'] == unrelated, cases
+        print("✅ Cases of tickets left without transactions removed")
+    finally:
+        _cleanup()
+
+if __name__ == "__main__":
+    test_master_case_regroup()
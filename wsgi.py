@@ -0,0 +1,14 @@
+"""
+WSGI entry point for running the web app under a production server.
+
+    gunicorn -w 1 -k gthread --threads 8 --preload -b 0.0.0.0:8888 wsgi:app
+
+--preload imports pandas and the rest of the app once, before the worker
+is forked, so the worker starts without redoing the imports. matplotlib is
+only imported when the first chart is drawn.
+Keep a single worker and scale with threads: background upload jobs and
+their /status entries live in the process, so a second worker would not
+see another worker's jobs.
+"""
+
+from app import app